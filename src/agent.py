@@ -12,13 +12,21 @@ import websockets
 import json
 import logging
 import random
-from datetime import datetime, timedelta
-from src.utils._consts import get_num_future_goals, get_future_goals_priority, get_future_goals_range, get_num_max_present_goals
+import time
+from datetime import datetime
+from src.utils._consts import get_num_future_goals, get_future_goals_priority, get_future_goals_range, get_num_max_present_goals, get_hierarchical_waypoint_distance, get_num_landmarks, is_snake_in_perfect_effects
 import sys
 
 ## Search
 from src.search.search_problem import SearchProblem
 from src.search.search_tree import SearchTree
+from src.search.search_budget import SearchBudget, NS_PER_SECOND
+from src.search.search_stats import SearchStats
+from src.search.incremental_planner import IncrementalPlanner
+from src.search.hierarchical_planner import HierarchicalPlanner
+from src.reachability import Reachability
+from src.goal_ordering import GoalOrdering
+from src.plan_validator import PlanValidator
 from src.snake_game import SnakeGame
 from src.goal import Goal
 
@@ -44,7 +52,7 @@ wslogger.setLevel(logging.CRITICAL)
 class Agent:
     """Autonomous AI client."""
     
-    def __init__(self, server_address, agent_name):
+    def __init__(self, server_address, agent_name, trace_file=None):
         
         ## Utils
         # print(f"Agent: {agent_name}")
@@ -60,15 +68,26 @@ class Agent:
         self.agent_name = agent_name
         self.websocket = None
         
+        ## Search statistics of the current tick {search kind: SearchStats}, written as JSON lines to the trace file (if any)
+        self.tick_stats = {}
+        self.trace = open(trace_file, "a", buffering=1) if trace_file else None # line buffered
+        
         ## Defined by the start of the game
         self.mapping = None 
         self.fps = None
         self.timeout = None
         self.domain = None
+        self.planner = None
+        self.hierarchical_planner = None
+        self.reachability = None
+        self.goal_ordering = None
+        self.plan_validator = None
         
         ## Action controller
         self.ts = None
+        self.tick_budget = None
         self.actions_plan = []
+        self.partial_plan = False # the plan stops on the time limit, before the goals
         self.action = None
         self.current_goals = []
         self.future_goals = []
@@ -81,6 +100,8 @@ class Agent:
     async def close(self):
         """Close the websocket connection"""
         await self.websocket.close()
+        if self.trace is not None:
+            self.trace.close()
         # self.logger.info("Websocket connection closed")
     
     async def run(self):
@@ -107,8 +128,15 @@ class Agent:
             width=map_info["size"][0], 
             height=map_info["size"][1], 
             internal_walls=MatrixOperations.find_ones(map_info['map']),
-            max_steps=map_info["timeout"]
+            max_steps=map_info["timeout"],
+            map_analysis={traverse: MatrixOperations.analyse_map(map_info['map'], traverse) for traverse in (True, False)},
+            num_landmarks=get_num_landmarks(map_info["size"][0], map_info["size"][1])
         )        
+        self.planner = IncrementalPlanner(self.domain)
+        self.hierarchical_planner = HierarchicalPlanner(self.domain)
+        self.reachability = Reachability(self.domain)
+        self.goal_ordering = GoalOrdering(self.domain)
+        self.plan_validator = PlanValidator(self.domain)
         self.mapping = Mapping(
             logger=self.logger,
             domain=self.domain,
@@ -134,7 +162,7 @@ class Agent:
                 
                 ## --- Main Logic ---
                 self.observe(state)
-                self.think(time_limit = ( self.ts + timedelta(seconds=1/(self.fps+0.6)) ))
+                self.think(self.tick_budget)
                 await self.act()
                 ## ------------------
                 
@@ -147,10 +175,15 @@ class Agent:
     
     def observe(self, state):
         self.ts = datetime.fromisoformat(state["ts"])
-        self.perfect_effects = self.domain.is_perfect_effects(state)
+        
+        ## Tick budget, counted from the server timestamp (the only clock conversion of the tick)
+        lag = (datetime.now(self.ts.tzinfo) - self.ts).total_seconds()
+        self.tick_budget = SearchBudget(seconds=1/(self.fps+0.6), start_ns=time.perf_counter_ns() - int(lag * NS_PER_SECOND))
+        ## The server state carries no observed objects, so no super food is counted yet
+        self.perfect_effects = is_snake_in_perfect_effects(state["step"], state["range"], state["traverse"], 0, self.domain.max_steps)
         
         ## Update the mapping
-        self.mapping.update(state, self.perfect_effects, self.current_goals + self.future_goals, self.actions_plan)
+        self.mapping.update(state, self.current_goals + self.future_goals, self.actions_plan)
     
     # ------- Act --------
 
@@ -172,16 +205,21 @@ class Agent:
     
     # ------ Think -------
     
-    def think(self, time_limit):
-        ## Follow the action plain (nothing new observed)            
-        if len(self.actions_plan) != 0 and self.mapping.nothing_new_observed(self.current_goals):
+    def think(self, budget):
+        self.tick_stats = {}
+        self._think(budget)
+        if self.trace is not None:
+            self._trace_tick(budget)
+    
+    def _think(self, budget):
+        ## Follow the action plain (nothing new observed, or the changes do not affect the plan)            
+        if len(self.actions_plan) != 0 and self.mapping.nothing_new_observed(self.current_goals) \
+            and not self.plan_validator.is_affected(self.mapping.changes, self.mapping.state, self.actions_plan, self.current_goals, self.perfect_effects):
             self.action = self.actions_plan.pop()
             
             ## Store a safe action for the next step
-            now = datetime.now()
-            half_time_limit = now + timedelta(seconds=(time_limit - now).total_seconds()/2)
             start_state = self.domain.result(self.mapping.state, self.action, self.current_goals)    
-            safe_point_2directions = self.find_safe_point_2directions(start_state, False, time_limit=half_time_limit)
+            safe_point_2directions = self.find_safe_point_2directions(start_state, False, budget.sub_budget(fraction=0.5))
             # self.logger.mapping(f"[iteration] safe point time: {(datetime.now() - self.ts).total_seconds()}")
             self.safe_action = safe_point_2directions.pop() if safe_point_2directions else None
 
@@ -198,13 +236,13 @@ class Agent:
         self.action = None
                 
         ## Get directions to goal
-        goals_directions, force_traverse_disabled = self.find_directions_to_goals(time_limit)
+        goals_directions, force_traverse_disabled = self.find_directions_to_goals(budget)
         
         # self.logger.mapping(f"find goal time: {(datetime.now() - self.ts).total_seconds()}")
         
         ## Get direction to safe point
         start_state = self.mapping.state if not goals_directions else self.domain.result(self.mapping.state, goals_directions[-1], self.current_goals)    
-        safe_point_2directions = self.find_safe_point_2directions(start_state, force_traverse_disabled, time_limit)
+        safe_point_2directions = self.find_safe_point_2directions(start_state, force_traverse_disabled, budget)
         
         # self.logger.mapping(f"safe point time: {(datetime.now() - self.ts).total_seconds()}")
         
@@ -212,6 +250,8 @@ class Agent:
         if goals_directions and safe_point_2directions:
             self.actions_plan = goals_directions
             self.action = self.actions_plan.pop()
+            if self.partial_plan:
+                self.actions_plan = [] # search again on the next step
             
             ## Store a safe action for the next step
             self.safe_action = safe_point_2directions.pop()
@@ -226,6 +266,16 @@ class Agent:
             self.safe_action = safe_point_2directions.pop()
             
             # self.logger.mapping("Safe action set!")
+        
+        ## In case of goals found (only), follow them if the first move keeps enough free space (flood fill)
+        elif goals_directions and self.reachability.is_safe(start_state):
+            self.actions_plan = goals_directions
+            self.action = self.actions_plan.pop()
+            if self.partial_plan:
+                self.actions_plan = [] # search again on the next step
+            self.safe_action = None
+            
+            # self.logger.mapping("Goal action plan set! [no safe point, free space checked]")
             
         ## In case of nothing found, or only goals found
         else:
@@ -241,99 +291,184 @@ class Agent:
             # self.logger.mapping("No path found! [no safe point found]")
                 
         
-    def find_directions_to_goals(self, time_limit):
+    def find_directions_to_goals(self, budget):
         
         ## Get a new goal
         self.current_goals, force_traverse_disabled = self._find_goals() # Find a new goal
         # self.logger.mapping(f"Searching for: {[goal.position for goal in self.current_goals]}")
+        
+        ## On large maps, a far goal is reached through the waypoints of the hierarchical planner
+        self.current_goals = self._find_waypoint_goals(self.current_goals)
+        
+        ## Repair the previous plan to the same goal (incremental replanning)
+        self.partial_plan = False
+        actions = self._find_incremental_directions(budget.sub_budget(seconds=self.current_goals[0].max_time, fraction=0.5))
+        if actions:
+            return actions, force_traverse_disabled
                 
         problem = SearchProblem(self.domain, self.mapping.state, self.current_goals)
         temp_tree = SearchTree(problem, strategy="A*")
         
-        ## Search for the given goals
+        ## Search for the given goals (on the time limit, keep the best plan found so far)
         actions = temp_tree.search(
-            time_limit=min(datetime.now() + timedelta(seconds=self.current_goals[0].max_time), time_limit)
+            budget=budget.sub_budget(seconds=self.current_goals[0].max_time),
+            anytime=True
         )
+        self._record_search("goals", temp_tree.stats)
                 
         ## Ignore the goal if no path found
         if self._is_empty(actions):
             self.mapping.ignore_goal(self.current_goals[0].position)
             return None, True
         
+        ## No bound: a partial path towards the goals (time limit), followed one step only.
+        ## The goal is ignored for a while (as on a time limit before), or an unreachable goal is kept forever
+        self.partial_plan = temp_tree.solution_bound == float("inf")
+        if self.partial_plan:
+            self.mapping.ignore_goal(self.current_goals[0].position)
         return actions, force_traverse_disabled
 
 
-    def find_safe_point_2directions(self, start_state, force_traverse_disabled, time_limit):
+    def _find_waypoint_goals(self, goals):
+        """Replace a far goal by the next waypoint on the cluster graph (the goals if not needed)"""
+        distance = get_hierarchical_waypoint_distance(self.domain.width, self.domain.height)
+        state = self.mapping.state
+        goal = goals[0]
+        if distance == 0 or self.domain.manhattan_distance(state.head, goal.position, state.traverse) <= distance:
+            return goals
+        
+        waypoint = self.hierarchical_planner.waypoint(state.head, goal.position, state.traverse, distance)
+        self._record_search("hierarchical", self.hierarchical_planner.stats)
+        if waypoint is None or waypoint == tuple(goal.position):
+            return goals
+        
+        # self.logger.mapping(f"Waypoint: {waypoint}")
+        return [Goal(
+            goal_type="waypoint",
+            max_time=goal.max_time,
+            visited_range=0,
+            priority=goal.priority,
+            position=waypoint
+        )]
+
+    def _find_incremental_directions(self, budget):
+        """Plan to a single goal with the incremental planner (None if not possible, or out of budget: A* takes over)"""
+        if len(self.current_goals) != 1 or self.current_goals[0].visited_range != 0:
+            return None
+        
+        state = self.mapping.state
+        goal = self.current_goals[0]
+        if not self.planner.is_planning_to(goal.position, state.traverse):
+            self.planner.reset(goal.position, state.traverse)
+        
+        ## Every observed snake cell is an obstacle (the snake model validates the plan)
+        blocked = set(self.mapping.objects_by_type[Tiles.SNAKE])
+        
+        ## Own body cells are obstacles unless they are free before the head can get there
+        ## (the distance is a lower bound on the move that reaches the cell)
+        occupancy = self.mapping.body_occupancy
+        blocked.update(
+            position for position in state.body[1:]
+            if not occupancy.is_free(position, self.domain.manhattan_distance(state.head, position, state.traverse))
+        )
+        
+        path = self.planner.plan(state.head, blocked, budget)
+        self._record_search("planner", self.planner.stats)
+        if path is None or len(path) < 2:
+            return None
+        
+        ## With perfect effects a super tile is avoided (SUPER_TILE_MULTIPLIER in the A* heuristic): leave those paths to A*
+        super_tiles = self.mapping.objects_by_type[Tiles.SUPER] if self.perfect_effects else ()
+        
+        _plan = self.planner.inverse_plan(path)
+        for action in reversed(_plan):
+            if action not in self.domain.actions(state):
+                return None
+            state = self.domain.result(state, action, self.current_goals)
+            if state.head in super_tiles and state.head != tuple(goal.position):
+                return None
+        
+        return _plan if self.domain.satisfies(state, goal) else None
+
+    def find_safe_point_2directions(self, start_state, force_traverse_disabled, budget):
         
         ## Get a safe point
-        self.future_goals = self._find_future_goals(self.current_goals, force_traverse_disabled, time_limit)
+        self.future_goals = self._find_future_goals(self.current_goals, force_traverse_disabled, budget)
         
         # self.logger.mapping(f"Safe points {[point.position for point in self.future_goals]}")
-        # self.logger.mapping(f"Time allowed: {(time_limit - datetime.now()).total_seconds()}")
-        ## Store a safe path to future goals
+        # self.logger.mapping(f"Time allowed: {budget.remaining()}")
+        if len(self.future_goals) == 0:
+            return None
+        
+        ## One search from the start state to every safe point
+        problem = SearchProblem(self.domain, start_state, list(self.future_goals))
+        temp_tree = SearchTree(problem, strategy="A*")
+        safe_actions = temp_tree.search_each_goal(
+            budget=budget.sub_budget(seconds=self.future_goals[0].max_time),
+            prioritized=True
+        )
+        self._record_search("safe_point", temp_tree.stats)
+        
+        ## Store a safe path to the first (by priority) reachable safe point
         safe_action = None
+        goal_idx = -1
         while self._is_empty(safe_action) and len(self.future_goals) > 0:
-            #print("remaining goals: ", len(self.future_goals))
+            goal_idx += 1
             current_safe_point = self.future_goals[0]
-
-            ## Search structure
-            problem = SearchProblem(self.domain, start_state, [current_safe_point])
-            temp_tree = SearchTree(problem, strategy="A*")
             
-            # self.logger.mapping(f"[@] Time allowed: {(time_limit - datetime.now()).total_seconds()}")
+            safe_action = safe_actions.get(goal_idx)
             
-            ## Search for the given goals
-            #print("Max time: ", current_safe_point.max_time)
-            safe_action = temp_tree.search(
-                first_two_actions=True,
-                time_limit=min(datetime.now() + timedelta(seconds=current_safe_point.max_time), time_limit)
-            )
-
-            #print("safe_action: ", safe_action)
-            
-            if safe_action == -1:
-                current_time = datetime.now()
-                # self.logger.mapping(f"Time limit exceeded: {(current_time - time_limit).total_seconds()}s")
-                                    
-                ## Check max execution time
-                if current_time > time_limit:
-                    self.mapping.ignore_goal(current_safe_point.position)
-                    self.future_goals.pop(0)
-                    break
+            if goal_idx not in safe_actions and temp_tree.time_limit_exceeded:
+                # self.logger.mapping(f"Time limit exceeded")
+                self.mapping.ignore_goal(current_safe_point.position)
+                self.future_goals.pop(0)
+                break
             
             if self._is_empty(safe_action):
                 # self.logger.mapping(f"[NOT FOUND] Safe path to {current_safe_point}")
                 self.mapping.ignore_goal(current_safe_point.position)
-                current_safe_point = self.future_goals.pop(0)
+                self.future_goals.pop(0)
         
         if self._is_empty(safe_action):
             return None
         
         return safe_action
         
+    def _record_search(self, kind, stats):
+        """Aggregate the statistics of a search on the current tick"""
+        self.tick_stats.setdefault(kind, SearchStats()).add(stats)
+    
+    def _trace_tick(self, budget):
+        """Write the tick statistics as a JSON line"""
+        total = SearchStats()
+        for stats in self.tick_stats.values():
+            total.add(stats)
+        self.trace.write(json.dumps({
+            "step": self.mapping.state.step,
+            "think_time": round(budget.elapsed(), 6),
+            "remaining_time": round(budget.remaining(), 6),
+            "action": self.action,
+            "searches": {kind: stats.as_dict() for kind, stats in self.tick_stats.items()},
+            "total": total.as_dict()
+        }) + "\n")
+    
     def _is_empty(self, obj):
         return obj == -1 or obj is None or len(obj) == 0
     
-    def _find_future_goals(self, goals, force_traverse_disabled, time_limit):
-        start_t = datetime.now()
+    def _find_future_goals(self, goals, force_traverse_disabled, budget):
         safe_points = self.mapping.peek_next_exploration(force_traverse_disabled=force_traverse_disabled)
-        # self.logger.mapping(f"Time to peek_next_exploration: {(datetime.now() - start_t).total_seconds()}")
-
-        total_time = (time_limit - datetime.now()).total_seconds()
-        num_safe_points = len(safe_points)
-        decay_factor = 0.5  # Adjust this factor to control the rate of exponential decay
-
-        # Calculate the sum of the exponential series
-        sum_exponential = sum(decay_factor ** i for i in range(num_safe_points))
+        # self.logger.mapping(f"Time to peek_next_exploration: {budget.elapsed()}")
 
-        # Allocate time to each goal based on the exponential decay factor
+        ## A single search covers every safe point, so each one is given the whole time
+        total_time = budget.remaining()
+        
         return [Goal(
             goal_type="peek",
-            max_time=(total_time / sum_exponential) * (decay_factor ** i),
+            max_time=total_time,
             visited_range=0,
             priority=10,
             position=pos
-        ) for i, pos in enumerate(safe_points)]        
+        ) for pos in safe_points]        
 
     def _find_goals(self, ):
         """Find a new goal based on mapping and state"""
@@ -349,7 +484,7 @@ class Agent:
                     break
                 goals.append(Goal(
                     goal_type="super", 
-                    max_time=(self.ts + timedelta(seconds=allowed_time) - datetime.now()).total_seconds(),
+                    max_time=allowed_time - self.tick_budget.elapsed(),
                     visited_range=0,
                     priority=10, 
                     position=obj_position
@@ -363,24 +498,27 @@ class Agent:
                     break
                 goals.append(Goal(
                     goal_type="food", 
-                    max_time=(self.ts + timedelta(seconds=allowed_time) - datetime.now()).total_seconds(), 
+                    max_time=allowed_time - self.tick_budget.elapsed(), 
                     visited_range=0,
                     priority=10, 
                     position=obj_position
                 ))
+
+        ## Visit the goals in the shortest order (the search chains them one by one)
+        goals = self.goal_ordering.order(self.mapping.state.body[0], goals, self.mapping.state.traverse)
         
         ## In case of no goals, go for exploration
         if len(goals) == 0:
             exploration_pos = self.mapping.next_exploration(force_traverse_disabled)
             
             visited_range = 0
-            if tuple(exploration_pos) in self.mapping.observed_objects and self.mapping.observed_objects[tuple(exploration_pos)][0] == Tiles.SUPER:
+            if self.mapping.observed_objects.type_at(exploration_pos) == Tiles.SUPER:
                 # self.logger.mapping("Safe point is a super food! (expanding range)")
                 visited_range = 1
                 
             goals.append(Goal(
                 goal_type="exploration", 
-                max_time=(self.ts + timedelta(seconds=allowed_time) - datetime.now()).total_seconds(), 
+                max_time=allowed_time - self.tick_budget.elapsed(), 
                 visited_range=visited_range,
                 priority=10, 
                 position=exploration_pos
@@ -403,13 +541,16 @@ class Agent:
             # self.logger.warning("No actions available!") # you're dead ;(
             return random.choice(["NORTH", "WEST", "SOUTH", "EAST"])
 
-        ## Use heuristics to choose the best action
-        min_heuristic = None
+        ## Rank the actions by free space (safe first, then the largest area), then by heuristic
+        best_rank = None
         for action in self.domain.actions(self.mapping.state):
             next_state = self.domain.result(self.mapping.state, action, self.current_goals)
+            area, tail_reachable = self.reachability.analyse(next_state)
+            is_safe = self.reachability.is_safe(next_state, area, tail_reachable)
             heuristic = self.domain.heuristic(next_state, self.current_goals) # change this!
-            if min_heuristic is None or heuristic < min_heuristic:
-                min_heuristic = heuristic
+            rank = (not is_safe, 0 if is_safe else -area, heuristic)
+            if best_rank is None or rank < best_rank:
+                best_rank = rank
                 best_action = action
 
         return best_action
@@ -0,0 +1,52 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+
+class Bitboards:
+    """Integer bitboards of the map: bit (y * width + x) is set when the cell is occupied.
+
+    The single bits (1 << cell) are computed when needed: a table of them grows with the square of the cells.
+    - wall_bits: static internal walls
+    - moves: {traverse: [[(action, cell), ...] per cell]}, the borders only wrap with traverse
+    """
+
+    def __init__(self, width, height, walls, directions):
+        self.width = width
+        self.height = height
+        self.wall_bits = self.from_positions(walls)
+
+        self.moves = {True: [], False: []}
+        for cell in range(width * height):
+            x, y = cell % width, cell // width
+            for traverse in (True, False):
+                cell_moves = []
+                for action, (dx, dy) in directions.items():
+                    nx, ny = x + dx, y + dy
+                    if not traverse and (nx < 0 or nx >= width or ny < 0 or ny >= height):
+                        continue # no wrapping around the borders
+                    cell_moves.append((action, (ny % height) * width + nx % width))
+                self.moves[traverse].append(cell_moves)
+
+    def index(self, position):
+        return position[1] * self.width + position[0]
+
+    def bit(self, position):
+        return 1 << (position[1] * self.width + position[0])
+
+    def zone(self, position):
+        """Cell and its 4 neighbours (possible next positions of a head)"""
+        cell = position[1] * self.width + position[0]
+        zone = 1 << cell
+        for _, neighbour in self.moves[True][cell]:
+            zone |= 1 << neighbour
+        return zone
+
+    def from_positions(self, positions):
+        bits = 0
+        for position in positions:
+            bits |= 1 << (position[1] * self.width + position[0])
+        return bits
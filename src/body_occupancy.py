@@ -0,0 +1,31 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+
+class BodyOccupancy:
+    """Time-indexed occupancy of the snake body.
+
+    Each body cell stores the first move that can enter it (the tail retreats one cell per move).
+    With a body of length L, the cell body[i] leaves the body after L - i moves, and the head can move
+    into it from the next move on (moving into the tail is a collision). The first index counts, for the
+    duplicated tail. Each food eaten on the way delays it by one move.
+    """
+
+    def __init__(self, body):
+        length = len(body)
+        self.free_steps = {}
+        for i, cell in enumerate(body):
+            if cell not in self.free_steps:
+                self.free_steps[cell] = length - i + 1
+
+    def free_step(self, position):
+        """First move that can enter the cell (0 if it is not part of the body)"""
+        return self.free_steps.get(position, 0)
+
+    def is_free(self, position, steps, growth=0):
+        """True if the head can enter the cell on the given move (eating growth foods on the way)"""
+        return self.free_steps.get(position, 0) + growth <= steps
@@ -0,0 +1,50 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+import numpy as np
+
+## Last seen step of the cells never seen (or expired)
+NEVER_SEEN = -1
+
+class CellsMapping:
+    """How many times each cell was seen, and on which step, as two NumPy arrays indexed [x, y].
+
+    The expiry is one masked operation over the map, instead of a scan cell by cell.
+    It reads like the previous {(x, y): (seen, timestamp)} dict (in, [], get), for the exploration path.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.seen = np.zeros((width, height), dtype=np.int32)
+        self.last_seen = np.full((width, height), NEVER_SEEN, dtype=np.int32)
+
+    def observe(self, xs, ys, step):
+        """Count a sight of the given cells (each cell at most once)"""
+        self.seen[xs, ys] += 1
+        self.last_seen[xs, ys] = step
+
+    def expire(self, step, duration):
+        """Forget the cells not seen in the last duration steps"""
+        expired = (self.last_seen != NEVER_SEEN) & (step - self.last_seen > duration)
+        self.seen[expired] = 0
+        self.last_seen[expired] = NEVER_SEEN
+
+    def __contains__(self, position):
+        x, y = position
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def __getitem__(self, position):
+        """(seen, last seen step)"""
+        if position not in self:
+            raise KeyError(position)
+        x, y = position
+        last_seen = int(self.last_seen[x, y])
+        return int(self.seen[x, y]), (None if last_seen == NEVER_SEEN else last_seen)
+
+    def get(self, position, default=None):
+        return self[position] if position in self else default
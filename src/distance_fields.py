@@ -0,0 +1,90 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+from collections import deque
+from functools import lru_cache
+
+from src.wall_index import NEIGHBOUR_DIRECTIONS
+
+UNREACHABLE = float("inf")
+
+class DistanceFields:
+    """True (BFS) distances to a goal cell on the static map, for both traverse modes.
+
+    - traverse: the map wraps around and the stones can be crossed
+    - not traverse: the borders and the stones block the snake
+    """
+
+    def __init__(self, width, height, walls, cache_size=128):
+        self.width = width
+        self.height = height
+
+        ## Neighbours of each cell (flat index), computed once per map
+        self.neighbours = {
+            True: [self._cell_neighbours(x, y, walls, traverse=True) for y in range(height) for x in range(width)],
+            False: [self._cell_neighbours(x, y, walls, traverse=False) for y in range(height) for x in range(width)]
+        }
+
+        self.walls = walls
+        
+        ## Distance fields are computed on demand, per goal cell (and per goal region, for the goals with a range)
+        self.field = lru_cache(maxsize=cache_size)(self._bfs)
+        self.region_field = lru_cache(maxsize=cache_size)(self._region_bfs)
+
+    def _cell_neighbours(self, x, y, walls, traverse):
+        neighbours = []
+        wall_mask = walls.neighbour_mask((x, y))
+        for bit, (dx, dy) in enumerate(NEIGHBOUR_DIRECTIONS):
+            nx, ny = x + dx, y + dy
+            if traverse:
+                nx, ny = nx % self.width, ny % self.height
+            elif nx < 0 or nx >= self.width or ny < 0 or ny >= self.height or wall_mask >> bit & 1:
+                continue
+            neighbours.append(ny * self.width + nx)
+        return neighbours
+
+    def _bfs(self, goal, traverse):
+        return self._multi_source_bfs([goal[1] * self.width + goal[0]], traverse)
+
+    def _region_bfs(self, goal, visited_range, traverse):
+        """Field of the cells within the (Manhattan) range of the goal, as in SnakeGame.is_goal_visited"""
+        sources = []
+        for dx in range(-visited_range, visited_range + 1):
+            for dy in range(-visited_range + abs(dx), visited_range - abs(dx) + 1):
+                x, y = goal[0] + dx, goal[1] + dy
+                if traverse:
+                    x, y = x % self.width, y % self.height
+                elif x < 0 or x >= self.width or y < 0 or y >= self.height or self.walls.is_wall((x, y)):
+                    continue # the head can not be there
+                sources.append(y * self.width + x)
+        return self._multi_source_bfs(sources, traverse)
+
+    def _multi_source_bfs(self, sources, traverse):
+        neighbours = self.neighbours[traverse]
+        field = [UNREACHABLE] * (self.width * self.height)
+        for source in sources:
+            field[source] = 0
+
+        queue = deque(sources)
+        while queue:
+            cell = queue.popleft()
+            distance = field[cell] + 1
+            for neighbour in neighbours[cell]:
+                if field[neighbour] == UNREACHABLE:
+                    field[neighbour] = distance
+                    queue.append(neighbour)
+        return field
+
+    def distance(self, position, goal_position, traverse):
+        """Length of the shortest path between the two cells, ignoring the snakes"""
+        goal = (goal_position[0] % self.width, goal_position[1] % self.height)
+        return self.field(goal, traverse)[(position[1] % self.height) * self.width + position[0] % self.width]
+
+    def region_distance(self, position, goal_position, visited_range, traverse):
+        """Length of the shortest path to a cell within the range of the goal, ignoring the snakes"""
+        goal = (goal_position[0] % self.width, goal_position[1] % self.height)
+        return self.region_field(goal, visited_range, traverse)[(position[1] % self.height) * self.width + position[0] % self.width]
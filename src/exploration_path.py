@@ -3,8 +3,9 @@ from src.utils._consts import get_exploration_length_threshold, get_last_explora
 
 class ExplorationPath:
     
-    def __init__(self, internal_walls, height, width):
-        self.internal_walls = internal_walls
+    def __init__(self, walls, traps, height, width):
+        self.walls = walls # WallIndex
+        self.traps = traps # {traverse: dead end positions}
         self.height = height
         self.width = width
         
@@ -101,9 +102,9 @@ class ExplorationPath:
 
     def is_valid_point(self, point, body, traverse, average_seen_density=None, exploration_point_seen_threshold=None):
         if average_seen_density is None or exploration_point_seen_threshold is None:
-            return (traverse or point not in self.internal_walls) and point not in body
+            return (traverse or not self.walls.is_wall(point)) and tuple(point) not in body and tuple(point) not in self.traps[traverse]
         else:
-            return (traverse or point not in self.internal_walls) and point not in body and (average_seen_density < exploration_point_seen_threshold or point[1] == 0)
+            return (traverse or not self.walls.is_wall(point)) and tuple(point) not in body and tuple(point) not in self.traps[traverse] and (average_seen_density < exploration_point_seen_threshold or point[1] == 0)
     
     def obstacle_value(self, point, traverse, body, is_ignored_goal):
         x = point[0]
@@ -112,7 +113,7 @@ class ExplorationPath:
         
         if x < 0 or x >= self.width or y < 0 or y >= self.height:
             return 1
-        if (not traverse and point in self.internal_walls) or point in body:
+        if (not traverse and self.walls.is_wall(point)) or tuple(point) in body:
             count += 1
         if is_ignored_goal(point):
             count += 2
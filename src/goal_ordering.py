@@ -0,0 +1,71 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+from src.distance_fields import UNREACHABLE
+
+MAX_ORDERED_GOALS = 8
+
+class GoalOrdering:
+    """Optimal visit order of the goals (Held-Karp), from the head through every goal.
+
+    The legs use the distances of the heuristic (domain.path_distance, counting the walls),
+    so the search only has to chain the goals in the given order.
+    """
+
+    def __init__(self, domain):
+        self.domain = domain
+
+    def distance_matrix(self, head, positions, traverse):
+        """matrix[i][j]: distance from the head (i = 0) or positions[i - 1] to positions[j], ignoring the snakes.
+        The head is never a destination: no distance field is built for it"""
+        path_distance = self.domain.path_distance
+        return [[path_distance(a, b, traverse) if a != b else 0 for b in positions] for a in [head] + positions]
+
+    def order(self, head, goals, traverse):
+        """Goals sorted by the shortest path from the head through all of them"""
+        if len(goals) <= 1 or len(goals) > MAX_ORDERED_GOALS:
+            return goals
+
+        n = len(goals)
+        positions = [tuple(goal.position) for goal in goals]
+        matrix = self.distance_matrix(tuple(head), positions, traverse)
+
+        ## After a super food the traverse may be lost (worst case scenario): the legs after it, like the heuristic
+        super_mask = sum(1 << j for j, goal in enumerate(goals) if goal.goal_type == "super")
+        after_super = self.distance_matrix(tuple(head), positions, False) if super_mask and traverse else matrix
+
+        ## cost[mask][j]: shortest path from the head through the goals in mask, ending in goal j
+        cost = [[UNREACHABLE] * n for _ in range(1 << n)]
+        parent = [[None] * n for _ in range(1 << n)]
+        for j in range(n):
+            cost[1 << j][j] = matrix[0][j]
+
+        for mask in range(1, 1 << n):
+            legs = after_super if mask & super_mask else matrix
+            for j in range(n):
+                if not mask & (1 << j) or cost[mask][j] == UNREACHABLE:
+                    continue
+                for k in range(n):
+                    if mask & (1 << k):
+                        continue
+                    new_cost = cost[mask][j] + legs[j + 1][k]
+                    if new_cost < cost[mask | (1 << k)][k]:
+                        cost[mask | (1 << k)][k] = new_cost
+                        parent[mask | (1 << k)][k] = j
+
+        full = (1 << n) - 1
+        last = min(range(n), key=lambda j: cost[full][j])
+        if cost[full][last] == UNREACHABLE:
+            return goals # some goal is unreachable, keep the closest first order
+
+        ## Rebuild the order, from the last goal
+        order = []
+        mask = full
+        while last is not None:
+            order.append(last)
+            mask, last = mask & ~(1 << last), parent[mask][last]
+        return [goals[i] for i in reversed(order)]
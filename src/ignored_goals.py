@@ -0,0 +1,67 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+import heapq
+import time
+
+import numpy as np
+
+class IgnoredGoals:
+    """Goals ignored for a while (no path found to them), with O(1) membership.
+
+    Each time a goal is ignored, its duration doubles (cumulated durations, a NumPy grid [x, y]).
+    The expiry time of each ignored goal (ignore time + its current duration) is kept in a dict,
+    and recomputed when the durations are reset; a min-heap of the expiry times evicts the expired
+    goals lazily (a changed expiry leaves an outdated heap entry behind).
+    """
+
+    def __init__(self, width, height, default_duration):
+        self.default_duration = default_duration
+        self.durations = np.full((width, height), default_duration, dtype=np.float64)
+        self.ignored_at = {} # {(x, y): time the goal was ignored}
+        self.expiry = {} # {(x, y): expiry time}
+        self.heap = [] # [(expiry time, (x, y))]
+
+    def ignore(self, position):
+        x, y = position
+        self.durations[x, y] *= 2 # double the time to ignore the goal
+        self.ignored_at[(x, y)] = time.time()
+        self.update_expiry((x, y))
+
+    def update_expiry(self, position):
+        expiry = self.ignored_at[position] + float(self.durations[position[0], position[1]])
+        self.expiry[position] = expiry
+        heapq.heappush(self.heap, (expiry, position))
+
+    def evict(self):
+        """Forget the expired goals"""
+        now = time.time()
+        while self.heap and self.heap[0][0] < now:
+            expiry, position = heapq.heappop(self.heap)
+            if self.expiry.get(position) == expiry:
+                del self.expiry[position]
+                del self.ignored_at[position]
+
+    def positions(self):
+        """Goals still ignored"""
+        self.evict()
+        return set(self.expiry)
+
+    def reset_duration(self, position):
+        self.durations[position[0], position[1]] = self.default_duration
+        position = (position[0], position[1])
+        if position in self.expiry:
+            self.update_expiry(position)
+
+    def reset_durations(self):
+        self.durations.fill(self.default_duration)
+        for position in self.expiry:
+            self.update_expiry(position)
+
+    def __contains__(self, position):
+        expiry = self.expiry.get(position)
+        return expiry is not None and time.time() <= expiry
@@ -0,0 +1,77 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+from collections import deque
+
+import numpy as np
+
+from src.distance_fields import UNREACHABLE
+
+## Distance of the cells not reachable from a landmark
+NO_DISTANCE = -1
+
+class Landmarks:
+    """ALT heuristic: BFS distance tables from a few landmarks, on the walled map (no traverse).
+
+    By the triangle inequality, |d(L, a) - d(L, b)| <= d(a, b) for any landmark L, so the best
+    landmark gives an admissible lower bound of the true distance, without a distance field per goal.
+    The landmarks are spread by farthest-point sampling; the tables take O(landmarks * cells) memory.
+    """
+
+    def __init__(self, width, height, neighbours, count=8):
+        self.width = width
+        self.height = height
+        self.neighbours = neighbours # flat index -> neighbour flat indices (static walls only)
+        size = width * height
+        dtype = np.int16 if size < np.iinfo(np.int16).max else np.int32
+
+        ## Farthest-point sampling: each landmark is the farthest cell from the previous ones
+        ## (the first one is the farthest from the first free cell, the walls can not be entered)
+        first = next((cell for cell in range(size) if any(cell in neighbours[n] for n in neighbours[cell])), 0)
+        closest = self._bfs(first)
+        self.landmarks = []
+        tables = []
+        for _ in range(count):
+            reachable = closest >= 0
+            if not reachable.any():
+                break
+            landmark = int(np.argmax(np.where(reachable, closest, NO_DISTANCE)))
+            table = self._bfs(landmark)
+            self.landmarks.append(landmark)
+            tables.append(table.astype(dtype))
+            closest = table if len(tables) == 1 else np.minimum(closest, table) # the first free cell is not a landmark
+
+        self.tables = np.stack(tables, axis=1) if tables else np.zeros((size, 0), dtype=dtype) # [cell, landmark]
+
+    def _bfs(self, source):
+        field = [NO_DISTANCE] * (self.width * self.height)
+        field[source] = 0
+        queue = deque([source])
+        while queue:
+            cell = queue.popleft()
+            distance = field[cell] + 1
+            for neighbour in self.neighbours[cell]:
+                if field[neighbour] == NO_DISTANCE:
+                    field[neighbour] = distance
+                    queue.append(neighbour)
+        return np.array(field, dtype=np.int32)
+
+    def distance(self, position, goal_position):
+        """Lower bound of the distance between the two cells (UNREACHABLE if not connected)"""
+        x, y = position[0] % self.width, position[1] % self.height
+        goal_x, goal_y = goal_position[0] % self.width, goal_position[1] % self.height
+        a = self.tables[y * self.width + x]
+        b = self.tables[goal_y * self.width + goal_x]
+
+        ## A landmark that reaches only one of the cells: they are not connected
+        if ((a < 0) != (b < 0)).any():
+            return UNREACHABLE
+
+        manhattan = abs(x - goal_x) + abs(y - goal_y)
+        if not len(a):
+            return manhattan
+        return max(manhattan, int(np.abs(a - b).max()))
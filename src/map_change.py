@@ -0,0 +1,20 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+
+class MapChange:
+    """Change of an observed cell on a tick (a type is None when nothing is observed there)"""
+
+    __slots__ = ("cell", "old_type", "new_type")
+
+    def __init__(self, cell, old_type, new_type):
+        self.cell = cell
+        self.old_type = old_type
+        self.new_type = new_type
+
+    def __repr__(self):
+        return f"MapChange({self.cell}, {self.old_type} -> {self.new_type})"
@@ -6,44 +6,54 @@ from collections import defaultdict
 from src.opponent_mapping import OpponentMapping
 from src.exploration_path import ExplorationPath
 from src.matrix_operations import MatrixOperations
-from src.goal import Goal
+from src.body_occupancy import BodyOccupancy
+from src.cells_mapping import CellsMapping
+from src.ignored_goals import IgnoredGoals
+from src.observation_store import ObservationStore
+from src.sight import Sight
+from src.map_change import MapChange
+from src.distance_fields import UNREACHABLE
 from consts import Tiles
 from src.utils._consts import get_exploration_point_seen_threshold, get_duration_of_expire_cells, get_food_seen_threshold, get_near_goal_range
 
 class Mapping:
     def __init__(self, logger, domain, fps):
         self.state = None
+        self.body_occupancy = None # first move that can enter each body cell (see src/body_occupancy.py)
         
         self.logger = logger
         self.domain = domain
         self.fps = fps
         self.DEFAULT_IGNORED_GOAL_DURATION = (1 / self.fps)
 
-        self.objects_updated = False
-        self.observed_objects = None
+        self.objects_updated = False # global changes (the cell changes are in self.changes)
+        self.changes = [] # [MapChange] of the last update (see src/map_change.py)
         self.observation_duration = 90
         self.opponent_duration = 5
+        self.observed_objects = ObservationStore( # shared read-only with the search states (see src/observation_store.py)
+            domain.width, 
+            domain.height, 
+            durations={Tiles.SNAKE: self.opponent_duration}, 
+            default_duration=self.observation_duration
+        )
+        self.objects_by_type = self.observed_objects.by_type # {Tiles: {(x, y)}}, index of the observed objects (also shared)
 
         self.super_foods = []
         
         self.exploration_path = ExplorationPath(
-            internal_walls=domain.internal_walls, 
+            walls=domain.walls, 
+            traps=domain.traps,
             height=domain.height,
             width=domain.width
         )
         
         self.ignored_objects = {Tiles.PASSAGE, Tiles.STONE}
 
-        # Cells mapping: 0 - unseen, 1 - seen
-        self.cells_mapping = {
-            (x, y): (0, None)
-            for x in range(self.domain.width)
-            for y in range(self.domain.height)
-        }   
+        # Cells mapping: times seen (0 - unseen) and last seen step, per cell (see src/cells_mapping.py)
+        self.cells_mapping = CellsMapping(self.domain.width, self.domain.height)
          
         self.ignored_duration = 5
-        self.temp_ignored_goals = set() # ((x, y), observed_timestamp) 
-        self.cumulated_ignored_goals = {(x, y): self.DEFAULT_IGNORED_GOAL_DURATION for x in range(self.domain.width) for y in range(self.domain.height)}
+        self.temp_ignored_goals = IgnoredGoals(self.domain.width, self.domain.height, self.DEFAULT_IGNORED_GOAL_DURATION) # cumulated durations (see src/ignored_goals.py)
         
         self.last_step = 0
 
@@ -54,40 +64,37 @@ class Mapping:
 
     @property
     def ignored_goals(self):
-        for goal, timestamp in self.temp_ignored_goals.copy():
-            if time.time() - timestamp > self.cumulated_ignored_goals[goal]:
-                self.temp_ignored_goals.remove((goal, timestamp))
-        return self.temp_ignored_goals
+        return self.temp_ignored_goals.positions()
 
     def ignore_goal(self, obj_pos):
-        self.temp_ignored_goals.add((tuple(obj_pos), time.time()))
-        self.cumulated_ignored_goals[tuple(obj_pos)] *= 2 # double the time to ignore the goal
+        self.temp_ignored_goals.ignore(obj_pos) # doubles the time to ignore the goal
     
     def is_ignored_goal(self, obj_pos, debug=False):
-        return any(obj_pos[0] == x and obj_pos[1] == y for ((x, y), ts) in self.ignored_goals)
+        return (obj_pos[0], obj_pos[1]) in self.temp_ignored_goals
      
     def next_exploration(self, force_traverse_disabled=False) -> tuple:
         return self.exploration_path.next_exploration_point(
-            self.state["body"], 
-            self.state["range"],
-            self.state["traverse"] and not force_traverse_disabled, 
+            self.state.body, 
+            self.state.sight_range,
+            self.state.traverse and not force_traverse_disabled, 
             self.cells_mapping,
             self.is_ignored_goal
         )
     
     def peek_next_exploration(self, n_points=1, force_traverse_disabled=False) -> list:
         return self.exploration_path.peek_exploration_point(
-            self.state["body"], 
-            self.state["traverse"] and not force_traverse_disabled, 
+            self.state.body, 
+            self.state.traverse and not force_traverse_disabled, 
             self.cells_mapping,
             n_points,
             self.is_ignored_goal,
             self.current_goal
         )
 
-    def update(self, state, perfect_state, goals, actions_plan):
+    def update(self, state, goals, actions_plan):
         
         self.objects_updated = False
+        self.changes = []
                 
         if self.last_step + 1 < state["step"]:
             # self.logger.critical(f"Unsynced steps: {state['step']} {self.last_step + 1}")
@@ -96,8 +103,11 @@ class Mapping:
         else:
             self.last_step += 1
         
+        ## Decode the sight once, for the opponent mapping and the objects update
+        sight = Sight(state["sight"], self.domain.width, state["body"])
+        
         start_t = datetime.now()
-        self.opponent.update(state)
+        self.opponent.update(state, sight)
         # self.logger.mapping(f"Opponent update time: {(datetime.now() - start_t).total_seconds()}s")
         
         ## In case, opponent observed
@@ -115,7 +125,7 @@ class Mapping:
             # self.logger.mapping("Opponent prediction failed")
 
         head = tuple(state["body"][0])
-        self.cumulated_ignored_goals[head] = self.DEFAULT_IGNORED_GOAL_DURATION    
+        self.temp_ignored_goals.reset_duration(head)
 
         # self.logger.debug(f"Old: {self.observed_objects}")
         
@@ -123,64 +133,44 @@ class Mapping:
         current_traverse_val = state["traverse"]
         
         ## Update the state
-        if self.state and self.state["range"] != current_range_val:
+        if self.state and self.state.sight_range != current_range_val:
             # Reset the exploration path if the range is changed
             self.exploration_path.exploration_path = []
             
-            if current_range_val > self.state["range"]:
+            if current_range_val > self.state.sight_range:
                 self.objects_updated = True # Stop eating super foods!
         
-        if self.state and self.state["traverse"] != current_traverse_val:
+        if self.state and self.state.traverse != current_traverse_val:
             # Reset the exploration path if the traverse is changed
             self.exploration_path.exploration_path = []
             if current_traverse_val:
                 # Reset the ignored goals if the traverse is enabled
-                self.cumulated_ignored_goals = {(x, y): self.DEFAULT_IGNORED_GOAL_DURATION for x in range(self.domain.width) for y in range(self.domain.height)}
+                self.temp_ignored_goals.reset_durations()
         
         
         
-        current_ignored_goals = set([goal for goal, timestamp in self.ignored_goals])
+        current_ignored_goals = self.ignored_goals
         if self.previous_ignored_keys:
             if not self.a_in_b_objects(a=self.previous_ignored_keys, b=current_ignored_goals):
                 self.objects_updated = True
                 # self.logger.mapping("Ignored goals changed")
         self.previous_ignored_keys = current_ignored_goals       
         
-        self.state = {
-            "body": state["body"] + [state["body"][-1]], # add the tail
-            "range": state["range"],
-            "traverse": state["traverse"],
-            "observed_objects": self.state["observed_objects"] if self.state else dict(),
-            "step": state["step"],
-            "visited_goals": set(),
-            "opponent_head": self.domain.opponent_head
-        }
-        
+        body = tuple(tuple(b) for b in state["body"])
+        body += (body[-1],) # add the tail
         
         currently_observed = defaultdict(list)
-        for x_str, y_dict in state["sight"].items():
-            x = int(x_str)
-            for y_str, obj_type in y_dict.items():
-                y = int(y_str)
-                seen, _ = self.cells_mapping[(x, y)]
-                timestamp = time.time()
-                self.cells_mapping[(x, y)] = (seen + 1, timestamp)
-                currently_observed[(x, y)] = [obj_type, timestamp]  
+        timestamp = time.time()
+        for x, y, obj_type in sight.items:
+            currently_observed[(x, y)] = [obj_type, timestamp]  
         
-        self.expire_cells_mapping()        
-
-        ## Copy for better readability
-        self.observed_objects = self.state["observed_objects"] # as a reference
+        ## Count the seen cells (at once), then forget the old ones
+        self.cells_mapping.observe(sight.xs, sight.ys, state["step"])
+        self.expire_cells_mapping(current_range_val, state["step"])        
 
         ## Clear the expired observed objects
-        del_positions = []
-        for position, [obj_type, timestamp] in self.observed_objects.items():
-            max_duration = self.observation_duration if obj_type != Tiles.SNAKE else self.opponent_duration                
-            if time.time() - timestamp > max_duration:
-                del_positions.append(position)
-        
-        for position in del_positions:
-            del self.observed_objects[position]
+        for position, obj_type in self.observed_objects.expire(time.time()):
+            self.changes.append(MapChange(position, obj_type, None))
                
 
         ## Update the observed objects
@@ -189,63 +179,71 @@ class Mapping:
             if position in self.observed_objects:
                 
                 # In case, the object is the same
-                if self.is_the_same_object(obj_type, position):
-                    self.observed_objects[position][1] = timestamp # update the timestamp
+                if self.is_the_same_object(obj_type, position, body):
+                    self.observed_objects.touch(position, timestamp) # update the timestamp
                     
                 else:
+                    old_type = self.observed_objects.type_at(position)
+                    
                     # In case, the object is to ignore
                     if obj_type in self.ignored_objects:
-                        del self.observed_objects[position] # ignore the empty space
+                        self.observed_objects.remove(position) # ignore the empty space
+                        self.changes.append(MapChange(position, old_type, None))
                         continue
                     
                     # In case, the object is now my body
-                    if obj_type == Tiles.SNAKE and list(position) in self.state["body"]:
-                        del self.observed_objects[position]
+                    if obj_type == Tiles.SNAKE and position in body:
+                        self.observed_objects.remove(position)
+                        self.changes.append(MapChange(position, old_type, None))
                         continue
                     
                     # Update the object type (and current ts)
-                    self.observed_objects[position] = [obj_type, timestamp]
-                    
-                    # Update a flag
-                    if not (obj_type == Tiles.SUPER and perfect_state):
-                        
-                        # In case, it's the opponent body and the prediction is correct
-                        if obj_type == Tiles.SNAKE and not self.opponent.predicted_failed:
-                            continue # not update the flag
-                            
-                        self.objects_updated = True
+                    self.observed_objects.add(position, obj_type, timestamp)
+                    self.changes.append(MapChange(position, old_type, obj_type))
                         
             else:
                 # This position is new
                 if obj_type not in self.ignored_objects:
                     
                     # In case, the object is now my body
-                    if obj_type == Tiles.SNAKE and list(position) in self.state["body"]:
+                    if obj_type == Tiles.SNAKE and position in body:
                         continue
                     
                     # Create the entry
-                    self.observed_objects[position] = [obj_type, timestamp]
-                    
-                    # Update a flag
-                    if not (obj_type == Tiles.SUPER and perfect_state):
-                        self.objects_updated = True
+                    self.observed_objects.add(position, obj_type, timestamp)
+                    self.changes.append(MapChange(position, None, obj_type))
 
+        ## The new state (after the objects update, its bitboards are built from them)
+        self.state = self.domain.new_state(
+            body=body,
+            sight_range=state["range"],
+            traverse=state["traverse"],
+            step=state["step"],
+            observed_objects=self.observed_objects,
+            objects_by_type=self.objects_by_type,
+            opponent_head=self.domain.opponent_head
+        )
+        self.body_occupancy = BodyOccupancy(body)
+        
         # if self.logger.mapping_active:
         #     self.print_mapping([goal.position for goal in goals], actions_plan)
         # self.logger.debug(f"New: {self.observed_objects}")
         
 
+    def count(self, obj_type):
+        return self.observed_objects.count(obj_type)
+
     def a_in_b_objects(self, a, b):
-        return all(a_i in b for a_i in a if a_i in self.observed_objects and not (self.observed_objects[a_i][0] == Tiles.SUPER and self.domain.is_perfect_effects(self.state)))
+        return all(a_i in b for a_i in a if a_i in self.observed_objects and not (self.observed_objects.type_at(a_i) == Tiles.SUPER and self.domain.is_perfect_effects(self.state)))
 
-    def is_the_same_object(self, obj_type, position):
+    def is_the_same_object(self, obj_type, position, body):
         
-        if obj_type == self.observed_objects[position][0]:
+        if obj_type == self.observed_objects.type_at(position):
             if obj_type != Tiles.SNAKE:
                 return True # the same object, but not a snake
 
             # compare two snake objects
-            if list(position) not in self.state["body"]:
+            if position not in body:
                 return True
         
         return False
@@ -260,36 +258,40 @@ class Mapping:
         first_goal = goals[0]
         if first_goal.goal_type == "exploration":
             x, y = first_goal.position
-            sight_range = self.state["range"]
-            exploration_point_seen_threshold = get_exploration_point_seen_threshold(sight_range, self.state["traverse"])
+            sight_range = self.state.sight_range
+            exploration_point_seen_threshold = get_exploration_point_seen_threshold(sight_range, self.state.traverse)
             average_seen_density = self.exploration_path.calcule_average_seen_density([x,y], sight_range, self.cells_mapping)
             if average_seen_density >= exploration_point_seen_threshold and not y == 0:
-                self.cumulated_ignored_goals[(x, y)] = self.DEFAULT_IGNORED_GOAL_DURATION
+                self.temp_ignored_goals.reset_duration((x, y))
                 return False
 
         return True
 
     def observed(self, obj_type):
-        return any(obj_type == object_type and not self.is_ignored_goal(position)
-                     for position, [object_type, timestamp] in self.observed_objects.items())
+        return any(not self.is_ignored_goal(position) for position in self.objects_by_type[obj_type])
         
     def closest_objects(self, obj_type):
-        """Find the closest object based on the heuristic"""
+        """Find the closest object based on the distance of the heuristic (only the objects of this type)"""
         is_super_food_type = obj_type == Tiles.SUPER
-        points = []         
-        min_heuristic = None
+        points = set()
+        min_distance = None
         closest = None
-        traverse = self.state["traverse"]
+        head = self.state.head
+        traverse = self.state.traverse
         ## Get the closest food
-        for position in self.observed_objects.keys():
-            if self.is_ignored_goal(position) or self.observed_objects[position][0] != obj_type or list(position) in self.state["body"]:
+        for position in self.observed_objects.positions(obj_type):
+            if self.is_ignored_goal(position) or position in self.state.body or position in self.domain.traps[traverse]:
                 continue  # ignore the ignored goals, and the other objects
+            if not self.domain.same_region(head, position, traverse):
+                continue # another region of the map, never reachable
             
-            points.append(position)
+            distance = self.domain.path_distance(head, position, traverse) # distance fields (or landmarks), cached per map
+            if distance == UNREACHABLE:
+                continue # cut off by the walls
             
-            heuristic = self.domain.heuristic(self.state, [Goal(goal_type=obj_type, position=position, visited_range=0)]) # change this!
-            if not min_heuristic or heuristic < min_heuristic:
-                min_heuristic = heuristic
+            points.add(position)
+            if min_distance is None or distance < min_distance:
+                min_distance = distance
                 closest = position
 
         if not closest:
@@ -297,7 +299,7 @@ class Mapping:
 
         ## Get near goals
         near_objects = [closest]
-        near_goal_range = get_near_goal_range(self.state["range"], len(self.state["body"]), is_super_food_type)
+        near_goal_range = get_near_goal_range(self.state.sight_range, len(self.state.body), is_super_food_type)
         for x in range(-near_goal_range, near_goal_range + 1):
             for y in range(-near_goal_range, near_goal_range + 1):
                 if (x == 0 and y == 0):
@@ -308,7 +310,7 @@ class Mapping:
                     continue # not of this type
                 
                 if not traverse:
-                    if self._outside_of_domain(position) or position in self.domain.internal_walls:
+                    if self._outside_of_domain(position) or self.domain.walls.is_wall(position):
                         continue
                     near_objects.append(position)
                     
@@ -335,12 +337,9 @@ class Mapping:
 
         return dx + dy                  
     
-    def expire_cells_mapping(self):
-        duration = get_duration_of_expire_cells(self.state["range"], self.fps, self.domain.width, self.domain.height)
-
-        for position, (seen, timestamp) in self.cells_mapping.items():
-            if timestamp is not None and time.time() - timestamp > duration:
-                self.cells_mapping[position] = (0, None)
+    def expire_cells_mapping(self, sight_range, step):
+        duration = get_duration_of_expire_cells(sight_range, self.fps, self.domain.width, self.domain.height)
+        self.cells_mapping.expire(step, duration * self.fps) # seconds to steps
 
     # def print_mapping(self, goals, actions_plan):
     #     self.logger.mapping("\033[2J") # clear the screen
@@ -1,3 +1,23 @@
+import numpy as np
+
+## Neighbour shifts (dx, dy) on a [x][y] matrix
+NEIGHBOUR_SHIFTS = ((0, -1), (1, 0), (0, 1), (-1, 0))
+
+class MapAnalysis:
+    """Static analysis of the free cells of a map, as [x][y] NumPy arrays (see MatrixOperations.analyse_map)
+
+    - dead_ends: cells of the 1-wide dead ends (a snake that gets in can not turn back)
+    - regions: connected region label of each free cell (-1 on the stones)
+    """
+
+    def __init__(self, dead_ends, regions):
+        self.dead_ends = dead_ends
+        self.regions = regions
+
+    def positions(self, mask):
+        """[x, y] positions where the mask is set"""
+        return np.argwhere(mask).tolist()
+
 class MatrixOperations:
     @staticmethod
     def find_ones(matrix):
@@ -8,6 +28,59 @@ class MatrixOperations:
                     ones_coordinates.append([row_idx, col_idx])
         return ones_coordinates
     
+    @staticmethod
+    def shift(matrix, dx, dy, wrap):
+        """Value of the (x + dx, y + dy) neighbour of each cell (False outside of the map, without wrap)"""
+        if wrap:
+            return np.roll(matrix, (-dx, -dy), axis=(0, 1))
+        shifted = np.zeros_like(matrix)
+        width, height = matrix.shape
+        shifted[max(0, -dx):width - max(0, dx), max(0, -dy):height - max(0, dy)] = \
+            matrix[max(0, dx):width - max(0, -dx) or None, max(0, dy):height - max(0, -dy) or None]
+        return shifted
+    
+    @staticmethod
+    def count_neighbours(mask, wrap):
+        return sum(MatrixOperations.shift(mask, dx, dy, wrap).astype(np.int8) for dx, dy in NEIGHBOUR_SHIFTS)
+    
+    @staticmethod
+    def analyse_map(matrix, traverse):
+        """Dead ends and regions of a [x][y] wall matrix (computed once per map)
+
+        With traverse, the map wraps around and the stones can be crossed: no dead ends, a single region.
+        """
+        walls = np.array(matrix, dtype=np.int8) == 1
+        if traverse:
+            return MapAnalysis(np.zeros_like(walls), np.zeros(walls.shape, dtype=np.int64))
+        free = ~walls
+        
+        ## Dead ends: peel the cells with at most one free neighbour, until none is left
+        alive = free.copy()
+        while True:
+            peel = alive & (MatrixOperations.count_neighbours(alive, False) <= 1)
+            if not peel.any():
+                break
+            alive &= ~peel
+        dead_ends = free & ~alive
+        
+        ## Regions: propagate the lowest label to the free neighbours, until stable
+        ## (a label is the flat index of a cell of the region: each cell also takes the label of its label cell)
+        width, height = free.shape
+        unlabeled = width * height
+        regions = np.where(free, np.arange(width * height).reshape(width, height), unlabeled)
+        while True:
+            lowest = regions
+            for dx, dy in NEIGHBOUR_SHIFTS:
+                neighbour = np.where(MatrixOperations.shift(free, dx, dy, False), MatrixOperations.shift(regions, dx, dy, False), unlabeled)
+                lowest = np.minimum(lowest, neighbour)
+            lowest = np.where(free, lowest.ravel()[np.minimum(lowest, unlabeled - 1)], unlabeled)
+            if np.array_equal(lowest, regions):
+                break
+            regions = lowest
+        regions = np.where(free, regions, -1)
+        
+        return MapAnalysis(dead_ends, regions)
+    
     # @staticmethod
     # def find_dead_ends(matrix):
     #     # TODO: Implement this method
@@ -0,0 +1,79 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+import numpy as np
+
+from consts import Tiles
+
+class ObservationStore:
+    """Observed objects of the map.
+
+    - grid: type of each cell (flat index y * width + x, None if nothing observed), O(1) point lookup
+    - by_type: {Tiles: {(x, y)}}, so the queries on one type only visit its objects
+    - expires: expiry time of each cell (NumPy array [x, y], inf if empty), for a vectorized expiry
+    """
+
+    def __init__(self, width, height, durations, default_duration):
+        self.width = width
+        self.height = height
+        self.durations = durations # {Tiles: seconds an observation lasts}
+        self.default_duration = default_duration
+
+        self.grid = [None] * (width * height)
+        self.by_type = {obj_type: set() for obj_type in Tiles}
+        self.expires = np.full((width, height), np.inf)
+
+    def type_at(self, position):
+        """Tile type in the given (x, y) position, or None if nothing was observed there (or out of the map)"""
+        x, y = position
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        return self.grid[y * self.width + x]
+
+    def positions(self, obj_type):
+        return self.by_type[obj_type]
+
+    def count(self, obj_type):
+        return len(self.by_type[obj_type])
+
+    def add(self, position, obj_type, timestamp):
+        """Add (or replace) an observed object"""
+        cell = position[1] * self.width + position[0]
+        previous = self.grid[cell]
+        if previous is not None:
+            self.by_type[previous].discard(position)
+        self.grid[cell] = obj_type
+        self.by_type[obj_type].add(position)
+        self.touch(position, timestamp)
+
+    def touch(self, position, timestamp):
+        """The object was observed again"""
+        duration = self.durations.get(self.type_at(position), self.default_duration)
+        self.expires[position[0], position[1]] = timestamp + duration
+
+    def remove(self, position):
+        """Remove the observed object (returns its type)"""
+        cell = position[1] * self.width + position[0]
+        obj_type = self.grid[cell]
+        self.by_type[obj_type].discard(position)
+        self.grid[cell] = None
+        self.expires[position[0], position[1]] = np.inf
+        return obj_type
+
+    def expire(self, now):
+        """Remove the objects not observed for their duration (returns [(position, type)])"""
+        expired = []
+        for x, y in zip(*np.nonzero(self.expires < now)):
+            position = (int(x), int(y))
+            expired.append((position, self.remove(position)))
+        return expired
+
+    def __contains__(self, position):
+        return self.type_at(position) is not None
+
+    def __len__(self):
+        return sum(len(positions) for positions in self.by_type.values())
@@ -44,7 +44,7 @@ class OpponentMapping:
         self.width = width
         self.height = height
 
-    def update(self, state):
+    def update(self, state, sight):
         # TODO: make a function to determine if the agent is the only one in the game
         if len(state['players']) == 1: 
             return      # THIS IS WRONG!!!!
@@ -54,7 +54,7 @@ class OpponentMapping:
         
         opponent_body = []
         targets_food = []
-        self.process_sight_state(state['sight'], opponent_body, targets_food)
+        self.process_sight_state(sight, opponent_body, targets_food)
         sight_range = state["range"]
 
         # If the opponent is not visible, return
@@ -110,21 +110,17 @@ class OpponentMapping:
         self.own_traverse = state['traverse']
 
     def process_sight_state(self, sight, opponent_body, targets_food):
+        # The sight is decoded once per tick (see src/sight.py), without the own snake cells
         self.sight_state = []
 
-        for x, y_info in sight.items():
-            x = int(x)
-            for y, value in y_info.items():
-                y = int(y)
-                position = (x, y)
-                if list(position) in self.own_body:
-                    continue
-                self.sight_state.append([x, y, value])
+        for x, y, value in sight.others():
+            position = (x, y)
+            self.sight_state.append([x, y, value])
 
-                if value == Tiles.SNAKE:
-                    opponent_body.append(position)
-                if value in [Tiles.FOOD, Tiles.SUPER]:
-                    targets_food.append(position)
+            if value == Tiles.SNAKE:
+                opponent_body.append(position)
+            if value in [Tiles.FOOD, Tiles.SUPER]:
+                targets_food.append(position)
     
     def reset_opponent_prediction(self):
         self.opponent_head_position = None
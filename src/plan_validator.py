@@ -0,0 +1,51 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+from src.snake_game import DIRECTIONS
+from consts import Tiles
+
+class PlanValidator:
+    """Checks the map changes of a tick (see src/map_change.py) against the current plan.
+
+    The plan is affected (and searched again) when:
+    - a goal cell changed (eaten, expired or replaced)
+    - a new food (or super food, if still wanted) shows up: a new goal candidate
+    - something shows up on a cell the plan passes
+    A freed cell never breaks a plan, and far opponent cells are not on the way.
+    """
+
+    def __init__(self, domain):
+        self.domain = domain
+
+    def plan_cells(self, state, actions_plan):
+        """Cells the head passes following the plan (the next action is the last one)"""
+        cells = set()
+        x, y = state.head
+        for action in reversed(actions_plan):
+            dx, dy = DIRECTIONS[action]
+            x, y = (x + dx) % self.domain.width, (y + dy) % self.domain.height # no border crossing without traverse
+            cells.add((x, y))
+        return cells
+
+    def is_affected(self, changes, state, actions_plan, goals, perfect_effects):
+        if not changes:
+            return False
+
+        goal_positions = {tuple(goal.position) for goal in goals}
+        cells = None
+        for change in changes:
+            if change.cell in goal_positions:
+                return True
+            if change.new_type is None:
+                continue # freed cell
+            if change.new_type == Tiles.FOOD or (change.new_type == Tiles.SUPER and not perfect_effects):
+                return True
+            if cells is None:
+                cells = self.plan_cells(state, actions_plan)
+            if change.cell in cells:
+                return True
+        return False
@@ -0,0 +1,63 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+
+class Reachability:
+    """Bitset flood fill over the map bitboards (see src/bitboards.py), with or without wrapping around the borders.
+
+    A fast safety oracle: the free area reachable from the head, and if the tail can be reached.
+    """
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.bitboards = domain.bitboards
+        width, height = domain.width, domain.height
+        self.width = width
+        self.row_shift = width * (height - 1)
+        self.full = (1 << (width * height)) - 1
+
+        ## Border masks
+        self.first_column = self.bitboards.from_positions((0, y) for y in range(height))
+        self.last_column = self.bitboards.from_positions((width - 1, y) for y in range(height))
+        self.first_row = self.bitboards.from_positions((x, 0) for x in range(width))
+        self.last_row = self.bitboards.from_positions((x, height - 1) for x in range(width))
+
+    def spread(self, bits, traverse):
+        """Cells at most one move away from the given cells"""
+        return self._spread(bits, traverse, self.full)
+
+    def _spread(self, bits, traverse, free_bits):
+        ## The shifted bits that cross a border are masked out (or wrapped around, with traverse)
+        width = self.width
+        spread = bits | ((bits << 1) & ~self.first_column | (bits >> 1) & ~self.last_column | bits << width | bits >> width)
+        if traverse:
+            spread |= (bits & self.last_column) >> (width - 1) | (bits & self.first_column) << (width - 1) \
+                | (bits & self.last_row) >> self.row_shift | (bits & self.first_row) << self.row_shift
+        return spread & free_bits
+
+    def flood(self, start_bits, free_bits, traverse):
+        """Bitboard of the free cells reachable from the start cells (the start cells included)"""
+        free_bits = (free_bits | start_bits) & self.full
+        reached = start_bits
+        while True:
+            spread = self._spread(reached, traverse, free_bits)
+            if spread == reached:
+                return reached
+            reached = spread
+
+    def analyse(self, state):
+        """(reachable area, tail reachable) from the head of the state"""
+        tail_bit = self.bitboards.bit(state.body[-1])
+        free_bits = ~(self.domain._blocked_bits(state) | self.domain.opponent_bits(state)) & self.full | tail_bit
+        reached = self.flood(self.bitboards.bit(state.body[0]), free_bits, state.traverse)
+        return (reached & ~tail_bit).bit_count() - 1, reached & tail_bit != 0
+
+    def is_safe(self, state, area=None, tail_reachable=None):
+        """The snake can follow its tail, or has room for its whole body"""
+        if area is None:
+            area, tail_reachable = self.analyse(state)
+        return tail_reachable or area >= len(state.body)
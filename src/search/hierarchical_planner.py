@@ -0,0 +1,193 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+import heapq
+from collections import deque
+
+from src.search.search_stats import SearchStats
+
+## Entrances at least this long get a transition at both ends (instead of the middle only)
+LONG_ENTRANCE = 6
+
+class ClusterGraph:
+    """Abstract graph of the static map, for one traverse mode.
+
+    The map is split into square clusters. The border cells of adjacent clusters are grouped
+    into entrances (runs of free cells), and each entrance gets one or two transitions.
+    The nodes are the transition cells; the edges are the transitions themselves (cost 1) and the
+    shortest paths between the nodes of the same cluster (computed on demand, and cached).
+    """
+
+    def __init__(self, width, neighbours, cluster_size):
+        self.width = width
+        self.neighbours = neighbours # flat index -> neighbour flat indices (static walls only)
+        self.cluster_size = cluster_size
+
+        ## Cluster of each cell
+        self.cluster = [
+            (cell % width // cluster_size, cell // width // cluster_size) for cell in range(len(neighbours))
+        ]
+
+        ## Border edges between each pair of adjacent clusters (both ways, the walls only have outgoing ones)
+        borders = {}
+        for cell, cell_neighbours in enumerate(neighbours):
+            for neighbour in cell_neighbours:
+                if self.cluster[cell] < self.cluster[neighbour] and cell in neighbours[neighbour]:
+                    borders.setdefault((self.cluster[cell], self.cluster[neighbour]), []).append((cell, neighbour))
+
+        ## Transitions, and the nodes of each cluster
+        self.transitions = {} # node -> nodes on the other side
+        self.cluster_nodes = {} # cluster -> nodes
+        for edges in borders.values():
+            for entrance in self._entrances(sorted(edges)):
+                chosen = [entrance[0], entrance[-1]] if len(entrance) >= LONG_ENTRANCE else [entrance[len(entrance) // 2]]
+                for cell, neighbour in chosen:
+                    self._add_transition(cell, neighbour)
+                    self._add_transition(neighbour, cell)
+
+        ## Intra cluster searches, per source cell: {cell: distance}
+        self.cluster_searches = {}
+
+    def _entrances(self, edges):
+        """Split the border edges into runs of adjacent cells"""
+        entrance = [edges[0]]
+        for edge in edges[1:]:
+            previous = entrance[-1]
+            if edge[0] in self.neighbours[previous[0]] and edge[1] in self.neighbours[previous[1]]:
+                entrance.append(edge)
+            else:
+                yield entrance
+                entrance = [edge]
+        yield entrance
+
+    def _add_transition(self, cell, neighbour):
+        if cell not in self.transitions:
+            self.transitions[cell] = set()
+            self.cluster_nodes.setdefault(self.cluster[cell], []).append(cell)
+        self.transitions[cell].add(neighbour)
+
+    def cluster_search(self, source):
+        """BFS from the cell, without leaving its cluster (cached)"""
+        if source in self.cluster_searches:
+            return self.cluster_searches[source]
+
+        cluster = self.cluster[source]
+        distances = {source: 0}
+        queue = deque([source])
+        while queue:
+            cell = queue.popleft()
+            for neighbour in self.neighbours[cell]:
+                if neighbour not in distances and self.cluster[neighbour] == cluster:
+                    distances[neighbour] = distances[cell] + 1
+                    queue.append(neighbour)
+
+        self.cluster_searches[source] = distances
+        return distances
+
+    def edges(self, node):
+        """(neighbour node, cost) of an abstract node"""
+        for neighbour in self.transitions.get(node, ()):
+            yield neighbour, 1
+        distances = self.cluster_search(node)
+        for other in self.cluster_nodes.get(self.cluster[node], ()):
+            if other != node and other in distances:
+                yield other, distances[other]
+
+
+class HierarchicalPlanner:
+    """HPA*: paths on the abstract cluster graph of the map.
+
+    Meant for the large maps, where a flat search cannot reach far goals inside a tick:
+    the long range path is planned on the clusters, and only the next leg (to a waypoint) is searched on the cells.
+    """
+
+    def __init__(self, domain, cluster_size=16):
+        self.domain = domain
+        self.width = domain.width
+        self.cluster_size = cluster_size
+        self.graphs = {} # traverse -> ClusterGraph, built on first use
+        self.stats = SearchStats() # counters of the last plan
+
+    def graph(self, traverse):
+        if traverse not in self.graphs:
+            self.graphs[traverse] = ClusterGraph(self.width, self.domain.distances.neighbours[traverse], self.cluster_size)
+        return self.graphs[traverse]
+
+    def index(self, position):
+        return (position[1] % self.domain.height) * self.width + position[0] % self.width
+
+    def position(self, cell):
+        return (cell % self.width, cell // self.width)
+
+    def find_path(self, start_position, goal_position, traverse):
+        """Abstract path [(cell, distance from the start)] from start to goal (None if unreachable)"""
+        graph = self.graph(traverse)
+        start, goal = self.index(start_position), self.index(goal_position)
+        self.stats = SearchStats()
+        self.stats.searches = 1
+
+        ## Same cluster, and connected inside it
+        start_distances = graph.cluster_search(start)
+        if goal in start_distances:
+            return [(start, 0), (goal, start_distances[goal])]
+
+        ## Link the goal to the nodes of its cluster (the cluster graph is undirected)
+        goal_distances = graph.cluster_search(goal)
+        goal_cluster = graph.cluster[goal]
+
+        def edges(cell):
+            if cell == start:
+                ## A start on a transition also crosses it (the waypoints are transition cells)
+                for neighbour in graph.transitions.get(start, ()):
+                    yield neighbour, 1
+                for node in graph.cluster_nodes.get(graph.cluster[start], ()):
+                    if node in start_distances:
+                        yield node, start_distances[node]
+                return
+            yield from graph.edges(cell)
+            if graph.cluster[cell] == goal_cluster and cell in goal_distances:
+                yield goal, goal_distances[cell]
+
+        ## A* on the abstract nodes
+        heuristic = lambda cell: self.domain.manhattan_distance(self.position(cell), goal_position, traverse)
+        costs = {start: 0}
+        parents = {start: None}
+        open_nodes = [(heuristic(start), 0, start)]
+        while open_nodes:
+            _, cost, cell = heapq.heappop(open_nodes)
+            if cost > costs[cell]:
+                continue # outdated entry
+            if cell == goal:
+                path = []
+                while cell is not None:
+                    path.append((cell, costs[cell]))
+                    cell = parents[cell]
+                return path[::-1]
+
+            self.stats.expansions += 1
+            for neighbour, edge_cost in edges(cell):
+                new_cost = cost + edge_cost
+                if new_cost < costs.get(neighbour, new_cost + 1):
+                    costs[neighbour] = new_cost
+                    parents[neighbour] = cell
+                    self.stats.generated += 1
+                    heapq.heappush(open_nodes, (new_cost + heuristic(neighbour), new_cost, neighbour))
+            self.stats.frontier_peak = max(self.stats.frontier_peak, len(open_nodes))
+        return None
+
+    def waypoint(self, start_position, goal_position, traverse, distance):
+        """First node of the abstract path at least the given distance away (the goal when closer)
+
+        The waypoints are transition cells, so their distance fields are reused between ticks.
+        """
+        path = self.find_path(start_position, goal_position, traverse)
+        if path is None:
+            return None
+        for cell, cost in path[1:]:
+            if cost >= distance:
+                return self.position(cell)
+        return tuple(goal_position)
@@ -0,0 +1,175 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+import heapq
+import time
+
+from src.search.search_stats import SearchStats
+from src.snake_game import DIRECTIONS
+
+INFINITY = float("inf")
+
+class IncrementalPlanner:
+    """D* Lite on the cell grid, to a single goal.
+
+    The g/rhs values are kept between ticks: when only a few cells change (blocked/unblocked)
+    or the head moves, only the affected part of the search is repaired.
+    A search stopped by its budget is resumed on the next plan (the open list keeps the inconsistent cells).
+    """
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.width = domain.width
+        self.height = domain.height
+
+        self.goal = None
+        self.traverse = None
+        self.blocked = set() # flat indices of the cells blocked by snakes
+        self.stats = SearchStats() # counters of the last plan
+
+    def reset(self, goal_position, traverse):
+        """Start planning to a new goal (forgets the previous search)"""
+        self.goal = (goal_position[0] % self.width, goal_position[1] % self.height)
+        self.traverse = traverse
+        self.neighbours = self.domain.distances.neighbours[traverse]
+        self.goal_cell = self.index(self.goal)
+        self.start_cell = None
+        self.km = 0
+        self.blocked = set()
+
+        self.g = [INFINITY] * (self.width * self.height)
+        self.rhs = [INFINITY] * (self.width * self.height)
+        self.rhs[self.goal_cell] = 0
+
+        ## Lazy priority queue: the cell entry is valid while its key matches self.open_keys
+        self.open_nodes = []
+        self.open_keys = {}
+        self.insert(self.goal_cell)
+
+    def is_planning_to(self, goal_position, traverse):
+        return self.goal is not None and self.traverse == traverse \
+            and self.goal == (goal_position[0] % self.width, goal_position[1] % self.height)
+
+    def index(self, position):
+        return position[1] * self.width + position[0]
+
+    def position(self, cell):
+        return (cell % self.width, cell // self.width)
+
+    def heuristic(self, cell_a, cell_b):
+        return self.domain.manhattan_distance(self.position(cell_a), self.position(cell_b), self.traverse)
+
+    def calculate_key(self, cell):
+        g_rhs = min(self.g[cell], self.rhs[cell])
+        return (g_rhs + self.heuristic(self.start_cell, cell) + self.km, g_rhs)
+
+    def insert(self, cell):
+        key = self.calculate_key(cell) if self.start_cell is not None else (self.rhs[cell], self.rhs[cell])
+        self.open_keys[cell] = key
+        heapq.heappush(self.open_nodes, (key, cell))
+
+    def top_key(self):
+        while self.open_nodes:
+            key, cell = self.open_nodes[0]
+            if self.open_keys.get(cell) == key:
+                return key
+            heapq.heappop(self.open_nodes) # stale entry
+        return (INFINITY, INFINITY)
+
+    def cost(self, cell_a, cell_b):
+        return INFINITY if cell_a in self.blocked or cell_b in self.blocked else 1
+
+    def update_vertex(self, cell):
+        if cell != self.goal_cell:
+            self.rhs[cell] = min((self.cost(cell, n) + self.g[n] for n in self.neighbours[cell]), default=INFINITY)
+        self.open_keys.pop(cell, None)
+        if self.g[cell] != self.rhs[cell]:
+            self.insert(cell)
+
+    def compute_shortest_path(self, budget=None):
+        """Expand the inconsistent cells until the start is consistent (False if the budget ran out first)"""
+        start = self.start_cell
+        while self.top_key() < self.calculate_key(start) or self.rhs[start] != self.g[start]:
+            if budget is not None and budget.spend(len(self.open_nodes)):
+                return False
+            key_old, cell = heapq.heappop(self.open_nodes)
+            del self.open_keys[cell]
+            self.stats.expansions += 1
+
+            key_new = self.calculate_key(cell)
+            if key_old < key_new:
+                self.insert(cell) # the key is outdated (the start moved)
+            elif self.g[cell] > self.rhs[cell]:
+                self.g[cell] = self.rhs[cell]
+                for n in self.neighbours[cell]:
+                    self.update_vertex(n)
+            else:
+                self.g[cell] = INFINITY
+                self.update_vertex(cell)
+                for n in self.neighbours[cell]:
+                    self.update_vertex(n)
+        return True
+
+    def plan(self, head, blocked_positions, budget=None):
+        """Repair the search for the new head and blocked cells, and return the path (list of cells) to the goal
+        (None if unreachable, or if the budget ran out)"""
+        self.stats = SearchStats()
+        self.stats.searches = 1
+        start_time = time.perf_counter()
+        try:
+            return self._plan(head, blocked_positions, budget)
+        finally:
+            self.stats.search_time = time.perf_counter() - start_time
+
+    def _plan(self, head, blocked_positions, budget):
+        start_cell = self.index(head)
+        blocked = {self.index(p) for p in blocked_positions} - {start_cell}
+
+        ## The start moved: keep the keys consistent
+        if self.start_cell is None:
+            self.start_cell = start_cell
+            ## Keys were inserted before the start was known
+            for cell in list(self.open_keys):
+                self.insert(cell)
+        elif start_cell != self.start_cell:
+            self.km += self.heuristic(self.start_cell, start_cell)
+            self.start_cell = start_cell
+
+        ## Only the changed cells (and their neighbours) are updated
+        changed = blocked ^ self.blocked
+        self.blocked = blocked
+        for cell in changed:
+            self.update_vertex(cell)
+            for n in self.neighbours[cell]:
+                self.update_vertex(n)
+
+        if not self.compute_shortest_path(budget):
+            self.stats.budget_exceeded = 1
+            return None
+
+        if self.g[start_cell] == INFINITY:
+            return None
+
+        ## Follow the lowest cost neighbours to the goal
+        path = [start_cell]
+        cell = start_cell
+        while cell != self.goal_cell and len(path) <= len(self.g):
+            cell = min(self.neighbours[cell], key=lambda n: self.cost(cell, n) + self.g[n])
+            if self.g[cell] == INFINITY:
+                return None
+            path.append(cell)
+        return [self.position(cell) for cell in path]
+
+    def inverse_plan(self, path):
+        """Actions along the path, from the goal to the start (same order as SearchTree.inverse_plan)"""
+        vectors = {tuple(vector): action for action, vector in DIRECTIONS.items()}
+        _plan = []
+        for (x0, y0), (x1, y1) in zip(path, path[1:]):
+            dx = (x1 - x0 + 1) % self.width - 1
+            dy = (y1 - y0 + 1) % self.height - 1
+            _plan.append(vectors[(dx, dy)])
+        return _plan[::-1]
@@ -0,0 +1,103 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+import time
+
+NS_PER_SECOND = 1_000_000_000
+
+## The clock is read about once every CHECK_PERIOD_NS of search
+CHECK_PERIOD_NS = 100_000 # 0.1 ms
+MAX_CHECK_INTERVAL = 256 # expansions
+
+class SearchBudget:
+    """Time, node and memory budget of a search.
+
+    - seconds: time limit, counted from start_ns (default: now)
+    - max_nodes: maximum number of expansions
+    - max_memory: maximum number of stored nodes (open nodes + transposition table)
+
+    The clock is only read every check_interval expansions. The interval is adapted
+    to the measured expansion rate, so the deadline is overshot by ~CHECK_PERIOD_NS at most.
+    """
+
+    def __init__(self, seconds=None, max_nodes=None, max_memory=None, start_ns=None):
+        self.start_ns = time.perf_counter_ns() if start_ns is None else start_ns
+        self.deadline_ns = None if seconds is None else self.start_ns + int(seconds * NS_PER_SECOND)
+        self.max_nodes = max_nodes
+        self.max_memory = max_memory
+
+        self.expansions = 0
+        self.exceeded = False
+
+        ## Adaptive clock checks
+        self.check_interval = 1
+        self.countdown = 1
+        self.last_check_ns = time.perf_counter_ns()
+        self.last_check_expansions = 0
+
+    def sub_budget(self, seconds=None, fraction=None, max_nodes=None, max_memory=None):
+        """Budget for a part of the work, that never goes beyond this budget's deadline"""
+        now = time.perf_counter_ns()
+        remaining = self.remaining(now)
+        if fraction is not None:
+            remaining *= fraction
+        if seconds is not None:
+            remaining = min(remaining, seconds)
+        return SearchBudget(
+            seconds=None if remaining == float("inf") else remaining,
+            max_nodes=max_nodes,
+            max_memory=max_memory,
+            start_ns=now
+        )
+
+    def remaining(self, now=None):
+        """Seconds left (inf without a time limit)"""
+        if self.deadline_ns is None:
+            return float("inf")
+        now = time.perf_counter_ns() if now is None else now
+        return max(0, self.deadline_ns - now) / NS_PER_SECOND
+
+    def elapsed(self):
+        """Seconds since the start of the budget"""
+        return (time.perf_counter_ns() - self.start_ns) / NS_PER_SECOND
+
+    def expired(self):
+        """Read the clock now (for the code outside of the search loops)"""
+        if self.deadline_ns is not None and time.perf_counter_ns() >= self.deadline_ns:
+            self.exceeded = True
+        return self.exceeded
+
+    def spend(self, stored_nodes=0):
+        """Count one expansion and check the budget (True if exceeded)"""
+        self.expansions += 1
+        if self.max_nodes is not None and self.expansions > self.max_nodes:
+            self.exceeded = True
+        elif self.max_memory is not None and stored_nodes > self.max_memory:
+            self.exceeded = True
+        elif self.deadline_ns is not None:
+            self.countdown -= 1
+            if self.countdown <= 0:
+                self._check_clock()
+        return self.exceeded
+
+    def _check_clock(self):
+        now = time.perf_counter_ns()
+        if now >= self.deadline_ns:
+            self.exceeded = True
+            return
+
+        ## Expansions done in about CHECK_PERIOD_NS, at the measured rate
+        elapsed_ns = now - self.last_check_ns
+        expansions = self.expansions - self.last_check_expansions
+        if elapsed_ns > 0:
+            self.check_interval = max(1, min(MAX_CHECK_INTERVAL, expansions * CHECK_PERIOD_NS // elapsed_ns))
+            ## Do not skip past the deadline
+            self.check_interval = max(1, min(self.check_interval, expansions * (self.deadline_ns - now) // elapsed_ns))
+
+        self.last_check_ns = now
+        self.last_check_expansions = self.expansions
+        self.countdown = self.check_interval
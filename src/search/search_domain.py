@@ -35,6 +35,10 @@ class SearchDomain(ABC):
     def heuristic(self, state, goals):
         pass
 
+    # Admissible (unweighted) estimate of the cost to the goals, for the anytime pruning and bound
+    def lower_bound(self, state, goals):
+        return self.heuristic(state, goals)
+
     # Test if the given "goal" is satisfied in "state"
     @abstractmethod
     def satisfies(self, state, goal):
@@ -44,4 +48,9 @@ class SearchDomain(ABC):
     @abstractmethod
     def is_goal_visited(self, head, goal, traverse):
         pass
+
+    # Compact, hashable signature of a state (equal signatures are the same search state)
+    @abstractmethod
+    def signature(self, state):
+        pass
     
\ No newline at end of file
@@ -7,37 +7,24 @@
  '''
 
 class SearchNode:
-    def __init__(self, state, parent, cost=0, heuristic=0, action=None): 
+    def __init__(self, state, parent, cost=0, heuristic=0, action=None, signature=None, lower_bound=0): 
         self.state = state
         self.parent = parent
         self.depth = parent.depth + 1 if parent != None else 0
         self.cost = cost
         self.heuristic = heuristic
         self.action = action
+        self.signature = signature
+        self.lower_bound = lower_bound # admissible part of the heuristic (anytime search only)
 
     def __str__(self):
         return "no(" + str(self.state) + "," + str(self.parent) + ")"
     def __repr__(self):
         return str(self)
     def __hash__(self):
-        return hash(str(self.state))
+        return hash(self.state)
     # def __lt__(self, other):
     #     ## A* search
     #     # return (self.cost + self.heuristic) < (other.cost + other.heuristic)
     #     ## Greedy search
     #     return self.heuristic < other.heuristic
-    
-    def in_parent(self, newstate):
-        
-        if self.parent is None:
-            return False
-        
-        if all(b in self.parent.state["body"] for b in newstate["body"]) and self.parent.state["traverse"] == newstate["traverse"]:
-            return True
-        
-        # if newstate["body"][0] in self.parent.state["body"] and self.parent.state["traverse"] == newstate["traverse"]:
-        #     return True
-        
-        return self.parent.in_parent(newstate)
-
-    
@@ -21,5 +21,11 @@ class SearchProblem:
     
     def satisfies_present_goals(self, state):
         goal_idx = self.num_present_goals - 1
-        return self.domain.is_goal_visited(head=state["body"][0], goal=self.goals[goal_idx], traverse=state["traverse"])
+        return self.domain.is_goal_visited(head=state.body[0], goal=self.goals[goal_idx], traverse=state.traverse)
+    
+    def satisfies_goal(self, state, goal_idx):
+        return self.domain.is_goal_visited(head=state.body[0], goal=self.goals[goal_idx], traverse=state.traverse)
+    
+    def position_key(self, state):
+        return (state.body[0], state.traverse)
     
\ No newline at end of file
@@ -0,0 +1,61 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+
+class SearchStats:
+    """Counters of a search (or the sum of several searches, see add)
+
+    - expansions: expanded (non terminal) nodes
+    - generated: children added to the open nodes
+    - duplicates: children pruned by the transposition table
+    - frontier_peak: largest number of open nodes
+    - first_solution_time: seconds until the first solution (None if not found)
+    - search_time: seconds spent searching
+    - budget_exceeded: number of searches stopped by the budget
+    """
+
+    def __init__(self):
+        self.searches = 0
+        self.expansions = 0
+        self.generated = 0
+        self.duplicates = 0
+        self.frontier_peak = 0
+        self.first_solution_time = None
+        self.search_time = 0.0
+        self.budget_exceeded = 0
+
+    @property
+    def expansions_per_second(self):
+        return self.expansions / self.search_time if self.search_time > 0 else 0.0
+
+    def add(self, other):
+        """Aggregate the counters of another search"""
+        self.searches += other.searches
+        self.expansions += other.expansions
+        self.generated += other.generated
+        self.duplicates += other.duplicates
+        self.frontier_peak = max(self.frontier_peak, other.frontier_peak)
+        if other.first_solution_time is not None:
+            self.first_solution_time = other.first_solution_time if self.first_solution_time is None \
+                else min(self.first_solution_time, other.first_solution_time)
+        self.search_time += other.search_time
+        self.budget_exceeded += other.budget_exceeded
+
+    def as_dict(self):
+        return {
+            "searches": self.searches,
+            "expansions": self.expansions,
+            "generated": self.generated,
+            "duplicates": self.duplicates,
+            "frontier_peak": self.frontier_peak,
+            "first_solution_time": self.first_solution_time,
+            "search_time": round(self.search_time, 6),
+            "budget_exceeded": self.budget_exceeded,
+        }
+
+    def __str__(self):
+        return f"SearchStats({self.as_dict()})"
@@ -5,24 +5,56 @@
  #  - Guilherme Santos (gui.santos91@ua.pt)
  # @ Create Time: 2024-10-13
  '''
-import datetime
+import heapq
+import itertools
 import sys
+import time
 from operator import attrgetter
 
 from src.search.search_node import SearchNode
 from src.search.search_problem import SearchProblem
+from src.search.search_stats import SearchStats
 from src.utils.exceptions import TimeLimitExceeded
 
+## Anytime (weighted A* with decreasing weight): f = cost + weight * heuristic
+ANYTIME_INITIAL_WEIGHT = 2.5
+ANYTIME_WEIGHT_DECREMENT = 0.5
+
 class SearchTree:
     """Search Tree"""
     
     def __init__(self, problem: SearchProblem, strategy="A*"):
         self.problem = problem
-        root = SearchNode(problem.initial, None, heuristic=problem.domain.heuristic(problem.initial, problem.goals))
-        self.open_nodes = [root]
+        root = SearchNode(
+            problem.initial, 
+            None, 
+            heuristic=problem.domain.heuristic(problem.initial, problem.goals),
+            signature=problem.domain.signature(problem.initial),
+            lower_bound=problem.domain.lower_bound(problem.initial, problem.goals)
+        )
         self.best_solution = None
-        self.non_terminals = 0
         self.strategy = strategy
+        
+        ## Anytime mode: best solution (or best frontier node) and its quality bound
+        self.anytime = False
+        self.weight = 1.0
+        self.best_frontier = None
+        self.solution_bound = float("inf")
+        
+        self.time_limit_exceeded = False
+        
+        ## Counters of the search (expansions, duplicates, frontier peak, ...)
+        self.stats = SearchStats()
+        self.stats.searches = 1
+        self.start_time = None
+        
+        ## Binary heap of (priority, insertion order, node); the insertion order keeps ties FIFO
+        self.open_nodes = []
+        self.insertion_counter = itertools.count()
+        self.add_to_open([root])
+        
+        ## Transposition table: state signature -> lowest cost found so far
+        self.closed = {root.signature: root.cost}
 
     # Get the root two actions to a given node
     def first_two_actions_to(self, node):
@@ -59,41 +91,72 @@ class SearchTree:
             n = n.parent         
         return self.inverse_plan(solution)
 
-    # Search solution
-    def search(self, time_limit=None, first_two_actions=False):
-        while self.open_nodes is not None and len(self.open_nodes) > 0:          
-            node = self.open_nodes.pop(0)
+    # Search solution, within the budget (SearchBudget)
+    #  - anytime: weighted A* with a decreasing weight. Instead of giving up on the time limit,
+    #    returns the best solution found so far (or the partial path to the best frontier node,
+    #    with an infinite self.solution_bound). The bound and the pruning use the domain lower bound
+    #    (the heuristic is weighted); without a solution, an exhausted frontier returns []
+    def search(self, budget=None, first_two_actions=False, anytime=False):
+        self.start_time = time.perf_counter()
+        if anytime and not self.anytime:
+            self.anytime = True
+            self.set_weight(ANYTIME_INITIAL_WEIGHT)
+        try:
+            return self._search(budget, first_two_actions)
+        finally:
+            self.stats.search_time += time.perf_counter() - self.start_time
+
+    def _search(self, budget, first_two_actions):
+        while self.open_nodes:
+            node = heapq.heappop(self.open_nodes)[2]
 
-            if time_limit is not None and datetime.datetime.now() >= time_limit: 
-                ## Time limit exceeded
+            if node.cost > self.closed[node.signature]:
+                continue # stale entry, the state was reopened with a lower cost
+
+            if budget is not None and budget.spend(len(self.open_nodes) + len(self.closed)): 
+                ## Budget exceeded
                 #print("time limit exceeded")
+                self.stats.budget_exceeded += 1
+                if self.anytime:
+                    heapq.heappush(self.open_nodes, (self.priority(node), next(self.insertion_counter), node))
+                    return self.anytime_plan(first_two_actions)
                 return -1
 
+            ## Anytime: this node can not improve the best solution
+            if self.best_solution is not None and node.cost + node.lower_bound >= self.best_solution.cost:
+                continue
+
             ## Goals test: all goals are satisfied
             if self.problem.goal_test(node.state):
                 # print("__________________")
+                self.solution_found()
+                if self.anytime:
+                    self.best_solution = node
+                    if self.strategy == "A*" and self.weight > 1:
+                        self.set_weight(max(1.0, self.weight - ANYTIME_WEIGHT_DECREMENT))
+                        continue # look for a better solution
+                    return self.anytime_plan(first_two_actions)
+                
                 ## In case only the first two directions are needed
                 if first_two_actions:
                     return self.first_two_actions_to(node)
                 
                 return self.inverse_plan_to_solution(node)
 
-            self.non_terminals += 1
+            self.stats.expansions += 1
             new_lower_nodes = []
-            visited_goal = None
             ## Iterate over possible actions to generate new nodes
             for act in self.problem.domain.actions(node.state):
-                
-                if time_limit is not None and datetime.datetime.now() >= time_limit: 
-                    ## Time limit exceeded
-                    return -1
-
                 new_state = self.problem.domain.result(node.state, act, self.problem.goals)
+                cost = node.cost + self.problem.domain.cost(node.state, act)
 
-                if node.in_parent(new_state):
+                ## Duplicate detection: only reopen a state if it was reached with a lower cost
+                signature = self.problem.domain.signature(new_state)
+                if signature in self.closed and self.closed[signature] <= cost:
+                    self.stats.duplicates += 1
                     continue
+                self.closed[signature] = cost
 
-                cost = node.cost + self.problem.domain.cost(node.state, act)
                 heuristic = self.problem.domain.heuristic(new_state, self.problem.goals)
                 # print("heuristic: ", heuristic)
                 new_node = SearchNode(
@@ -102,25 +165,139 @@ class SearchTree:
                     cost,
                     heuristic=heuristic,
                     action=act,
+                    signature=signature,
+                    lower_bound=self.problem.domain.lower_bound(new_state, self.problem.goals) if self.anytime else 0
                     )
                 
                 new_lower_nodes.append(new_node)
                 
+                if self.best_frontier is None or heuristic < self.best_frontier.heuristic:
+                    self.best_frontier = new_node
+                
             self.add_to_open(new_lower_nodes)
+        
+        ## The frontier ran out: the best solution, or no path at all (never a partial one)
+        if self.anytime and self.best_solution is not None:
+            return self.anytime_plan(first_two_actions)
         return []
     
-    # add new nodes to the list of open nodes according to the strategy
-    def add_to_open(self, new_lower_nodes):
-        self.open_nodes.extend(new_lower_nodes)
+    # Single-source search to every goal of the problem, independently (not in sequence):
+    # expands once per head position, heading to the first pending goal, and returns
+    # {goal index: first two actions} for each reached goal (None if less than two actions away)
+    #  - prioritized: stop as soon as a goal has actions and all the goals before it are resolved
+    def search_each_goal(self, budget=None, prioritized=False):
+        self.start_time = time.perf_counter()
+        try:
+            return self._search_each_goal(budget, prioritized)
+        finally:
+            self.stats.search_time += time.perf_counter() - self.start_time
+
+    def _search_each_goal(self, budget, prioritized):
+        goals = self.problem.goals
+        pending = set(range(len(goals)))
+        actions_to_goals = {}
+        reached = {self.problem.position_key(self.problem.initial)}
+        target_idx = None
         
+        while self.open_nodes and pending:
+            if prioritized and any(actions and goal_idx < min(pending) for goal_idx, actions in actions_to_goals.items()):
+                break
+            
+            ## Head to the first pending goal
+            if target_idx != min(pending):
+                target_idx = min(pending)
+                self.retarget([goals[target_idx]])
+            
+            node = heapq.heappop(self.open_nodes)[2]
+            
+            if budget is not None and budget.spend(len(self.open_nodes) + len(reached)):
+                self.time_limit_exceeded = True
+                self.stats.budget_exceeded += 1
+                break
+            
+            for goal_idx in list(pending):
+                if self.problem.satisfies_goal(node.state, goal_idx):
+                    actions_to_goals[goal_idx] = self.first_two_actions_to(node)
+                    pending.remove(goal_idx)
+                    self.solution_found()
+            
+            self.stats.expansions += 1
+            new_lower_nodes = []
+            for act in self.problem.domain.actions(node.state):
+                new_state = self.problem.domain.result(node.state, act, [])
+                
+                ## Each position is expanded once (the first arrival is kept)
+                position_key = self.problem.position_key(new_state)
+                if position_key in reached:
+                    self.stats.duplicates += 1
+                    continue
+                reached.add(position_key)
+                
+                cost = node.cost + self.problem.domain.cost(node.state, act)
+                heuristic = self.problem.domain.heuristic(new_state, [goals[target_idx]])
+                new_lower_nodes.append(SearchNode(new_state, node, cost, heuristic=heuristic, action=act))
+            
+            self.add_to_open(new_lower_nodes)
+        
+        return actions_to_goals
+    
+    # Time to the first solution (since the start of the current search call)
+    def solution_found(self):
+        if self.stats.first_solution_time is None:
+            self.stats.first_solution_time = self.stats.search_time + time.perf_counter() - self.start_time
+    
+    # Recompute the heuristic of the open nodes to new goals (re-prioritizes the open nodes)
+    def retarget(self, goals):
+        for _, _, node in self.open_nodes:
+            node.heuristic = self.problem.domain.heuristic(node.state, goals)
+            if self.anytime:
+                node.lower_bound = self.problem.domain.lower_bound(node.state, goals)
+        self.set_weight(self.weight)
+    
+    # Anytime result (time limit): the best solution, or the partial path to the best frontier node if none was found yet
+    def anytime_plan(self, first_two_actions):
+        if self.best_solution is not None:
+            ## Sub-optimality bound: best cost / lowest (unweighted) f in the frontier
+            lowest_f = min((n.cost + n.lower_bound for _, _, n in self.open_nodes), default=None)
+            if lowest_f is None or lowest_f >= self.best_solution.cost:
+                self.solution_bound = 1.0
+            else:
+                self.solution_bound = self.best_solution.cost / max(lowest_f, 1) # finite: a complete solution
+            node = self.best_solution
+        else:
+            self.solution_bound = float("inf") # partial plan
+            node = self.best_frontier
+            if node is None or node.heuristic == float("inf"):
+                return [] # no frontier node gets closer to the goals
+            
+        if first_two_actions:
+            return self.first_two_actions_to(node)
+        if self.best_solution is not None:
+            return self.inverse_plan_to_solution(node)
+        return self.inverse_plan(node)
+    
+    # Change the weight of the heuristic (re-prioritizes the open nodes)
+    def set_weight(self, weight):
+        self.weight = weight
+        self.open_nodes = [(self.priority(node), order, node) for _, order, node in self.open_nodes]
+        heapq.heapify(self.open_nodes)
+    
+    # add new nodes to the heap of open nodes according to the strategy
+    def add_to_open(self, new_lower_nodes):
+        for node in new_lower_nodes:
+            heapq.heappush(self.open_nodes, (self.priority(node), next(self.insertion_counter), node))
+        self.stats.generated += len(new_lower_nodes)
+        self.stats.frontier_peak = max(self.stats.frontier_peak, len(self.open_nodes))
+    
+    # Priority of a node in the open heap (lower is expanded first)
+    def priority(self, node):
         if self.strategy == "A*":
-            self.open_nodes.sort(key=lambda node: node.cost + node.heuristic)
-            #print(self.open_nodes)
+            return node.cost + self.weight * node.heuristic
         elif self.strategy == "greedy":
-            self.open_nodes.sort(key=lambda node: node.heuristic)
+            return node.heuristic
         else:
-            sys.exit(f"Unknown strategy: {self.strategy}")        
+            sys.exit(f"Unknown strategy: {self.strategy}")
         
     def __str__(self):
-        return f"SearchTree: {self.problem} {self.best_solution} {self.non_terminals} {self.open_nodes}"
+        return f"SearchTree: {self.problem} {self.best_solution} {self.stats} {[node for _, _, node in self.open_nodes]}"
     
\ No newline at end of file
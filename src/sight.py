@@ -0,0 +1,37 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+import numpy as np
+
+class Sight:
+    """Sight payload of a tick ({"x": {"y": tile}}, string keys), decoded once for every consumer.
+
+    - xs, ys: NumPy arrays of the seen cells (vectorized cell counts)
+    - own_body: mask of the cells of the own snake (from a set of the body cells)
+    - items: [(x, y, tile)] as plain ints, for the consumers that loop over the cells
+    """
+
+    def __init__(self, payload, width, body):
+        items = [
+            (x, int(y_str), tile)
+            for x_str, y_tiles in payload.items()
+            for x in (int(x_str),)
+            for y_str, tile in y_tiles.items()
+        ]
+        self.items = items
+        self.xs = np.array([item[0] for item in items], dtype=np.int32)
+        self.ys = np.array([item[1] for item in items], dtype=np.int32)
+
+        body_cells = {y * width + x for x, y in body}
+        self.own_body = np.array([x + y * width in body_cells for x, y, _ in items], dtype=bool)
+
+    def __len__(self):
+        return len(self.items)
+
+    def others(self):
+        """(x, y, tile) of the seen cells outside of the own snake"""
+        return [item for item, own in zip(self.items, self.own_body.tolist()) if not own]
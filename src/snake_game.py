@@ -6,6 +6,12 @@
  # @ Create Time: 2024-10-13
  '''
 from src.search.search_domain import SearchDomain
+from src.snake_state import SnakeState
+from src.zobrist import ZobristTable, HEAD, BODY, GOAL
+from src.distance_fields import DistanceFields
+from src.landmarks import Landmarks
+from src.bitboards import Bitboards
+from src.wall_index import WallIndex
 from consts import Tiles
 import time
 import datetime
@@ -23,95 +29,146 @@ DIRECT_COLLISION_PENALTY = 150
 ADJACENT_COLLISION_PENALTY = 100
 
 class SnakeGame(SearchDomain):
-    def __init__(self, logger, width, height, internal_walls, max_steps, opponent_head=None, opponent_direction=None):
+    def __init__(self, logger, width, height, internal_walls, max_steps, opponent_head=None, opponent_direction=None, map_analysis=None, num_landmarks=0):
         self.logger = logger
         self.width = width
         self.height = height
         self.internal_walls = internal_walls
+        self.walls = WallIndex(width, height, internal_walls) # O(1) wall queries, shared by the agent modules
         self.max_steps = max_steps
         self.opponent_head = opponent_head
         self.opponent_direction = opponent_direction
+        self.zobrist = ZobristTable(width, height)
+        self.distances = DistanceFields(width, height, self.walls)
+        
+        ## ALT landmarks on the walled map, instead of a distance field per goal (large maps only)
+        self.landmarks = Landmarks(width, height, self.distances.neighbours[False], num_landmarks) if num_landmarks else None
+        self.bitboards = Bitboards(width, height, self.walls, DIRECTIONS)
+        
+        ## Static map analysis {traverse: MapAnalysis} (see src/matrix_operations.py)
+        ## The dead ends are traps: a snake that gets in can not turn back (never picked as goals or exploration points,
+        ## and never entered from outside unless there is no other move; a snake already inside can always move)
+        self.map_analysis = map_analysis
+        self.traps = {
+            traverse: frozenset(tuple(position) for position in analysis.positions(analysis.dead_ends))
+            for traverse, analysis in map_analysis.items()
+        } if map_analysis else {True: frozenset(), False: frozenset()}
+        self.trap_bits = {traverse: self.bitboards.from_positions(traps) for traverse, traps in self.traps.items()}
+    
+    def new_state(self, body, sight_range, traverse, step, observed_objects, objects_by_type, opponent_head=None):
+        """Root state of a search (hashed from scratch, the children are hashed incrementally)"""
+        return SnakeState(
+            body=body,
+            sight_range=sight_range,
+            traverse=traverse,
+            step=step,
+            observed_objects=observed_objects,
+            objects_by_type=objects_by_type,
+            key=self.zobrist.hash_state(body, traverse, frozenset()),
+            body_bits=self.bitboards.from_positions(body),
+            snake_bits=self.bitboards.from_positions(objects_by_type[Tiles.SNAKE]),
+            opponent_head=opponent_head
+        )
     
     def is_perfect_effects(self, state):
-        return is_snake_in_perfect_effects(state, self.max_steps)
+        num_supers = len(state.objects_by_type[Tiles.SUPER])
+        return is_snake_in_perfect_effects(state.step, state.sight_range, state.traverse, num_supers, self.max_steps)
     
-    def _check_collision(self, state, action):
-        """Check if the action will result in a collision"""
-        body = state["body"]
-        vector = DIRECTIONS[action]
-        new_head = [(body[0][0] + vector[0]) % self.width, (body[0][1] + vector[1]) % self.height]
-        
-        if new_head in body:
-            return True
+    def is_predicted_opponent(self, state, x, y):
+        """Whether the cell is one of the predicted opponent cells (the last opponent_steps cells of its line)"""
+        if not state.opponent_steps or self.opponent_direction is None:
+            return False
+        dx, dy = DIRECTIONS[self.opponent_direction]
+        head_x, head_y = state.opponent_head
+        if dx:
+            return y == head_y and (head_x - x) * dx % self.width < state.opponent_steps
+        return x == head_x and (head_y - y) * dy % self.height < state.opponent_steps
+    
+    def opponent_bits(self, state):
+        """Bitboard of the predicted opponent cells (O(steps), for the flood fills)"""
+        if not state.opponent_steps or self.opponent_direction is None:
+            return 0
+        dx, dy = DIRECTIONS[self.opponent_direction]
+        x, y = state.opponent_head
+        bits = 0
+        for _ in range(min(state.opponent_steps, self.width if dx else self.height)):
+            bits |= self.bitboards.bit((x, y))
+            x, y = (x - dx) % self.width, (y - dy) % self.height
+        return bits
+    
+    def _blocked_bits(self, state):
+        """Bitboard of the cells the head can not move into (the predicted opponent cells are checked per move)"""
+        ## Own body (including the tail) and other snakes
+        blocked = state.body_bits | state.snake_bits
         
-        head_tuple = tuple(new_head)
-        if head_tuple in state["observed_objects"]:
-            if state["observed_objects"][head_tuple][0] == Tiles.SNAKE:
-                return True # collision with other snake
-            
-        ## Predict opponent next head collision
-        opponent_head = state["opponent_head"]
+        ## Predict opponent next head collision (POSSIBLE collision with the opponent head)
+        opponent_head = state.opponent_head
         if opponent_head:
-            # print(opponent_head)
-            if new_head == opponent_head:
-                return True # collision with opponent head
-
-            possible_collisions = [
-                ((opponent_head[0] - 1) % self.width, opponent_head[1]),
-                ((opponent_head[0] + 1) % self.width, opponent_head[1]),
-                (opponent_head[0], (opponent_head[1] - 1) % self.height),
-                (opponent_head[0], (opponent_head[1] + 1) % self.height)
-            ]
-
-            if (new_head[0], new_head[1]) in possible_collisions:
-                return True # POSSIBLE collision with opponent head
-        
-        if not state["traverse"]:
-            if new_head in self.internal_walls:
-                return True
-            
-            head = body[0]
-            distance = [abs(new_head[0] - head[0]), abs(new_head[1] - head[1])]
-            if distance[0] > 1 or distance[1] > 1:
-                return True
-            
-        return False
+            blocked |= self.bitboards.zone(opponent_head)
+        
+        if not state.traverse:
+            blocked |= self.bitboards.wall_bits
+        return blocked
+    
+    def _check_collision(self, state, action):
+        """Check if the action will result in a collision"""
+        return action not in self.actions(state)
     
     def actions(self, state):
         """Return the list of possible actions in a given state"""
-        _actlist = []
-        for action in DIRECTIONS:
-            if not self._check_collision(state, action):
-                _actlist.append(action)
-        return _actlist 
+        ## Moves of the head cell (without wrapping around the borders, if not traverse)
+        blocked = self._blocked_bits(state)
+        head_cell = self.bitboards.index(state.body[0])
+        moves = [(action, cell) for action, cell in self.bitboards.moves[state.traverse][head_cell] if not blocked >> cell & 1]
+        if state.opponent_steps:
+            moves = [(action, cell) for action, cell in moves if not self.is_predicted_opponent(state, cell % self.width, cell // self.width)]
+        
+        ## Prune the moves into a trap from outside of it (the only moves left are still taken)
+        trap_bits = self.trap_bits[state.traverse]
+        if trap_bits and not trap_bits >> head_cell & 1:
+            outside = [action for action, cell in moves if not trap_bits >> cell & 1]
+            if outside:
+                return outside
+        return [action for action, _ in moves]
+    
+    def same_region(self, position, other, traverse):
+        """Whether the two cells are connected on the static map (the map analysis regions)"""
+        if not self.map_analysis:
+            return True
+        regions = self.map_analysis[traverse].regions
+        return regions[position[0], position[1]] == regions[other[0], other[1]]
 
     def result(self, state, action, goals): # Given a state and an action, what is the next state?
-        body = state["body"]
+        body = state.body
         vector = DIRECTIONS[action]
-        new_head = [(body[0][0] + vector[0]) % self.width, (body[0][1] + vector[1]) % self.height]
+        new_head = ((body[0][0] + vector[0]) % self.width, (body[0][1] + vector[1]) % self.height)
         
-        new_body = [new_head] + body[:-1]
-
-        sight_range = state["range"]
+        new_body = (new_head,) + body[:-1]
+        
+        ## Zobrist hash: the head moves (and becomes body), the tail drops
+        zobrist = self.zobrist
+        tail_key = zobrist.key(body[-1], BODY)
+        key = state.key ^ zobrist.key(body[0], HEAD) ^ zobrist.key(body[0], BODY) ^ zobrist.key(new_head, HEAD) ^ tail_key
                 
-        traverse = state["traverse"]
-        visited_goals = state["visited_goals"].copy()
+        traverse = state.traverse
+        visited_goals = state.visited_goals # shared with the parent, unless a goal is visited
         for goal in goals:
             if tuple(goal.position) not in visited_goals:
                 if self.is_goal_visited(new_head, goal, traverse):
                     if goal.goal_type == "super":
-                        new_body.append(body[-1])
-                        new_body.append(body[-1])
+                        new_body += (body[-1], body[-1]) # (two tail copies cancel out in the hash)
                         traverse = False # worst case scenario
                     elif goal.goal_type == "food":
-                        new_body.append(body[-1]) # grow the snake
-                    visited_goals.add(tuple(goal.position))
+                        new_body += (body[-1],) # grow the snake
+                        key ^= tail_key
+                    visited_goals = visited_goals | {tuple(goal.position)}
+                    key ^= zobrist.key(goal.position, GOAL)
                 else:
                     break # if one goal is not visited, we break the loop
 
         ## Increment opponent head
-        observed_objects = state["observed_objects"].copy()
-        new_opponent_head = state["opponent_head"]
+        new_opponent_head = state.opponent_head
+        opponent_steps = state.opponent_steps
         
         ## Add it in the first iteration
         if new_opponent_head is None and self.opponent_head is not None:
@@ -124,17 +181,31 @@ class SnakeGame(SearchDomain):
             opponent_vector = DIRECTIONS[self.opponent_direction]
             new_opponent_head = ((new_opponent_head[0] + opponent_vector[0]) % self.width, (new_opponent_head[1] + opponent_vector[1]) % self.height)
             
-            observed_objects[new_opponent_head] = [Tiles.SNAKE, 5]
+            opponent_steps += 1 # the predicted cells are derived from the head and the count
+        
+        if traverse != state.traverse:
+            key ^= zobrist.traverse_key
+        
+        ## Body bitboard: the tail cell is freed, unless the tail stays (duplicated or growing)
+        body_bits = state.body_bits
+        if new_body[-1] != body[-1]:
+            body_bits &= ~self.bitboards.bit(body[-1])
+        body_bits |= self.bitboards.bit(new_head)
             
-        return {
-                "body": new_body,
-                "range": state["range"],
-                "traverse": traverse,
-                "observed_objects": observed_objects,
-                "step": state["step"] + 1,
-                "visited_goals": visited_goals,
-                "opponent_head": new_opponent_head
-                }
+        return SnakeState(
+            body=new_body,
+            sight_range=state.sight_range,
+            traverse=traverse,
+            step=state.step + 1,
+            observed_objects=state.observed_objects, # shared, read-only
+            objects_by_type=state.objects_by_type,
+            visited_goals=visited_goals,
+            opponent_head=new_opponent_head,
+            opponent_steps=opponent_steps,
+            key=key,
+            body_bits=body_bits,
+            snake_bits=state.snake_bits # shared
+        )
 
     def cost(self, state, action):
         return 1
@@ -142,13 +213,13 @@ class SnakeGame(SearchDomain):
     def heuristic(self, state, goals):        
         
         if len(goals) == 1:
-            heuristic_value = self.manhattan_distance(state["body"][0], goals[0].position, state["traverse"]) 
+            heuristic_value = self.goal_distance(state.body[0], goals[0], state.traverse) 
             
-            head = state["body"][0]
-            traverse = state["traverse"]
-            visited_goals = state.get("visited_goals") # check if this is correct
+            head = state.body[0]
+            traverse = state.traverse
+            visited_goals = state.visited_goals
                         
-            if self.is_perfect_effects(state) and any([head[0] == p[0] and head[1] == p[1] and state["observed_objects"][p][0] == Tiles.SUPER for p in state["observed_objects"]]):
+            if head in state.objects_by_type[Tiles.SUPER] and self.is_perfect_effects(state):
                 heuristic_value *= SUPER_TILE_MULTIPLIER
             
             ## Simulate opponent movement
@@ -156,19 +227,19 @@ class SnakeGame(SearchDomain):
             
             return heuristic_value * 10
 
-        head = state["body"][0]
-        traverse = state["traverse"]
-        visited_goals = state.get("visited_goals") # check if this is correct
+        head = state.body[0]
+        traverse = state.traverse
+        visited_goals = state.visited_goals
         
         heuristic_value = 0   
         previous_goal_position = head
         priority = 250
 
-        snake_length = len(state["body"])
+        snake_length = len(state.body)
         body_weight = 1 # + snake_length // 10
         walls_weight = 1 # + snake_length // 5
 
-        ## Manhattan distance to the goals
+        ## Distance to the goals
         for goal in goals: 
             if tuple(goal.position) in visited_goals:
                 priority /= 5
@@ -177,10 +248,9 @@ class SnakeGame(SearchDomain):
                 continue
             
             goal_position = goal.position
-            goal_range = goal.visited_range
 
-            ## Manhattan distance (not counting walls)
-            distance = self.manhattan_distance(previous_goal_position, goal_position, traverse) - goal_range
+            ## True distance to the goal range (counting walls, not counting snakes)
+            distance = self.goal_distance(previous_goal_position, goal, traverse)
 
             heuristic_value += distance #* priority
             priority /= 5
@@ -190,7 +260,7 @@ class SnakeGame(SearchDomain):
             if goal.goal_type == "super":
                 traverse = False # worst case scenario
         
-        if self.is_perfect_effects(state) and any([head[0] == p[0] and head[1] == p[1] and state["observed_objects"][p][0] == Tiles.SUPER for p in state["observed_objects"]]):
+        if head in state.objects_by_type[Tiles.SUPER] and self.is_perfect_effects(state):
             heuristic_value *= SUPER_TILE_MULTIPLIER
         
         # ## Simulate opponent movement
@@ -217,6 +287,38 @@ class SnakeGame(SearchDomain):
         
     #     return opponents_density
 
+    def path_distance(self, position, goal_position, traverse):
+        """Distance counting the walls: the distance field of the goal, or the landmarks lower bound"""
+        if self.landmarks is None:
+            return self.distances.distance(position, goal_position, traverse)
+        if traverse:
+            return self.manhattan_distance(position, goal_position, traverse) # no walls, exact
+        return self.landmarks.distance(position, goal_position)
+    
+    def lower_bound(self, state, goals):
+        """Admissible estimate of the moves to visit the pending goals in order (the heuristic is weighted)"""
+        traverse = state.traverse
+        position = state.body[0] # None after a goal with a range (the leg start is unknown)
+        bound = 0
+        for goal in goals:
+            if tuple(goal.position) not in state.visited_goals:
+                if position is not None:
+                    bound += self.goal_distance(position, goal, traverse)
+                position = None if goal.visited_range else goal.position
+            if goal.goal_type == "super":
+                traverse = True # unknown effect: the shortest distances
+        return bound
+    
+    def goal_distance(self, position, goal, traverse):
+        """Distance to the closest cell that visits the goal (within its Manhattan range), a lower bound"""
+        visited_range = goal.visited_range or 0
+        if visited_range == 0:
+            return self.path_distance(position, goal.position, traverse)
+        if self.landmarks is not None:
+            ## The landmarks bound the distance to the goal cell only: fall back on Manhattan
+            return max(0, self.manhattan_distance(position, goal.position, traverse) - visited_range)
+        return self.distances.region_distance(position, goal.position, visited_range, traverse)
+    
     def manhattan_distance(self, head, goal_position, traverse):
         dx_no_crossing_walls = abs(head[0] - goal_position[0])
         dx = min(dx_no_crossing_walls, self.width - dx_no_crossing_walls) if traverse else dx_no_crossing_walls
@@ -227,7 +329,7 @@ class SnakeGame(SearchDomain):
         return dx + dy
 
     def satisfies(self, state, goal):
-        return tuple(goal.position) in state["visited_goals"]
+        return tuple(goal.position) in state.visited_goals
 
     def is_goal_visited(self, head, goal, traverse): 
         visited_range = goal.visited_range
@@ -237,6 +339,9 @@ class SnakeGame(SearchDomain):
 
         return distance <= visited_range
 
+    def signature(self, state):
+        return state.key
+
     def is_goal_available(self, goal):
         return datetime.datetime.now() >= goal.max_time
     
\ No newline at end of file
@@ -0,0 +1,47 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+
+class SnakeState:
+    """Immutable snake state, shared by the mapping and the search nodes.
+
+    - body: tuple of (x, y) cells, head first
+    - visited_goals: frozenset of visited goal positions (shared with the parent until a goal is visited)
+    - observed_objects: read-only reference to the mapping ObservationStore (never copied)
+    - objects_by_type: read-only reference to the mapping index of the objects {Tiles: {(x, y)}}
+    - key: Zobrist hash of the body, traverse and visited goals (see src/zobrist.py)
+    - body_bits: bitboard of the body cells (see src/bitboards.py)
+    - snake_bits: bitboard of the observed snake cells (shared by every state of a search)
+    - opponent_steps: number of predicted opponent cells, a straight line back from opponent_head
+      (the opponent keeps its direction: O(1) per state, see SnakeGame.is_predicted_opponent)
+    """
+
+    __slots__ = ("body", "sight_range", "traverse", "step", "visited_goals", "observed_objects", "objects_by_type", "opponent_head", "opponent_steps", "key", "body_bits", "snake_bits")
+
+    def __init__(self, body, sight_range, traverse, step, observed_objects, objects_by_type, key, body_bits, snake_bits, visited_goals=frozenset(), opponent_head=None, opponent_steps=0):
+        self.body = body
+        self.sight_range = sight_range
+        self.traverse = traverse
+        self.step = step
+        self.observed_objects = observed_objects
+        self.objects_by_type = objects_by_type
+        self.visited_goals = visited_goals
+        self.opponent_head = opponent_head
+        self.opponent_steps = opponent_steps
+        self.key = key
+        self.body_bits = body_bits
+        self.snake_bits = snake_bits
+
+    @property
+    def head(self):
+        return self.body[0]
+
+    def __hash__(self):
+        return self.key
+
+    def __repr__(self):
+        return f"SnakeState(body={self.body}, traverse={self.traverse}, step={self.step}, visited_goals={set(self.visited_goals)})"
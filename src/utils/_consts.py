@@ -74,32 +74,30 @@ def get_duration_of_expire_cells(sight_range, fps, width, height):
 #
 ############################################################################################################
 
-def is_snake_in_perfect_effects(state, max_steps):
+def is_snake_in_perfect_effects(step, sight_range, traverse, num_supers, max_steps):
     """
     This function is used to determine if the snake should go for the super food.
     Goal: So the snake goes for the super food if it's required.
     """
-    traverse = state["traverse"]
-    
-    if state["step"] > (max_steps - 300):
+    if step > (max_steps - 300):
         return False
     
-    if state["range"] == 2:
+    if sight_range == 2:
         supers_required = 0
         
-    elif state["range"] == 3:
+    elif sight_range == 3:
         supers_required = 6 # TODO: or 8 
         
-    elif state["range"] == 4:
+    elif sight_range == 4:
         supers_required = 12 if traverse else 8
         
-    elif state["range"] == 5:
+    elif sight_range == 5:
         supers_required = 15 if traverse else 0
         
-    elif state["range"] == 6:
+    elif sight_range == 6:
         supers_required = 20 if traverse else 0
         
-    return not len([p for p in state.get("observed_objects", []) if state["observed_objects"][p][0] == Tiles.SUPER]) >= supers_required
+    return not num_supers >= supers_required
     
 def get_num_future_goals(current_range):
     """
@@ -115,6 +113,24 @@ def get_num_max_present_goals():
     """
     # infinite -> the get_near_goal_range will determine the quantity of present goals
     return 5#3
+
+def get_hierarchical_waypoint_distance(width, height):
+    """
+    This function is used to determine the distance of the waypoints to the far goals (0: no waypoints).
+    Goal: So the snake reaches far goals on large maps, one leg (flat search) at a time.
+    """
+    if width * height < 64 * 64:
+        return 0 # small enough for the flat search
+    return 32
+
+def get_num_landmarks(width, height):
+    """
+    This function is used to determine the number of landmarks of the heuristic (0: distance fields).
+    Goal: So the heuristic counts the walls on large maps, without a distance field per goal.
+    """
+    if width * height < 64 * 64:
+        return 0 # the distance fields are cheap enough
+    return 8
     
 def get_future_goals_priority(num_goals):
     """
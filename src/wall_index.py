@@ -0,0 +1,53 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+
+## Neighbour directions, in the order of the neighbour mask bits
+NEIGHBOUR_DIRECTIONS = ((0, -1), (1, 0), (0, 1), (-1, 0)) # north, east, south, west
+
+class WallIndex:
+    """O(1) queries on the internal walls (stones) of the map.
+
+    - positions: frozenset of (x, y) walls
+    - grid: bytearray, 1 on the walls (index y * width + x)
+    - neighbour_masks: per cell, bit i is set when the neighbour in NEIGHBOUR_DIRECTIONS[i] is a wall (wrapping around the borders)
+    """
+
+    def __init__(self, width, height, internal_walls):
+        self.width = width
+        self.height = height
+        self.positions = frozenset(tuple(wall) for wall in internal_walls)
+
+        self.grid = bytearray(width * height)
+        for x, y in self.positions:
+            self.grid[y * width + x] = 1
+
+        self.neighbour_masks = bytearray(width * height)
+        for y in range(height):
+            for x in range(width):
+                mask = 0
+                for bit, (dx, dy) in enumerate(NEIGHBOUR_DIRECTIONS):
+                    if self.grid[((y + dy) % height) * width + (x + dx) % width]:
+                        mask |= 1 << bit
+                self.neighbour_masks[y * width + x] = mask
+
+    def is_wall(self, position):
+        """True if the position is a wall (positions outside of the map are not walls)"""
+        x, y = position
+        return 0 <= x < self.width and 0 <= y < self.height and self.grid[y * self.width + x] == 1
+
+    def neighbour_mask(self, position):
+        return self.neighbour_masks[position[1] * self.width + position[0]]
+
+    def __contains__(self, position):
+        return self.is_wall(position)
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def __len__(self):
+        return len(self.positions)
@@ -0,0 +1,40 @@
+'''
+ # @ Authors:
+ #  - Pedro Pinto (pmap@ua.pt)
+ #  - Joao Pinto (jpapinto@ua.pt)
+ #  - Guilherme Santos (gui.santos91@ua.pt)
+ # @ Create Time: 2024-10-13
+ '''
+import random
+
+## Roles of a cell in a state
+HEAD = 0
+BODY = 1
+GOAL = 2 # visited goal
+NUM_ROLES = 3
+
+class ZobristTable:
+    """Random 64-bit keys per (cell, role), XORed together to hash a snake state"""
+
+    def __init__(self, width, height, seed=0):
+        self.width = width
+        self.height = height
+
+        rng = random.Random(seed)
+        self.keys = [rng.getrandbits(64) for _ in range(width * height * NUM_ROLES)]
+        self.traverse_key = rng.getrandbits(64)
+
+    def key(self, position, role):
+        x, y = position[0] % self.width, position[1] % self.height
+        return self.keys[(y * self.width + x) * NUM_ROLES + role]
+
+    def hash_state(self, body, traverse, visited_goals):
+        """Full hash of a state (the search updates it incrementally)"""
+        key = self.key(body[0], HEAD)
+        for cell in body[1:]:
+            key ^= self.key(cell, BODY)
+        if traverse:
+            key ^= self.traverse_key
+        for position in visited_goals:
+            key ^= self.key(position, GOAL)
+        return key
@@ -12,7 +12,7 @@ import os
 from src.agent import Agent
 
 async def agent_loop(server_address="localhost:8000", agent_name="student"):
-    agent = Agent(server_address, agent_name)
+    agent = Agent(server_address, agent_name, trace_file=os.environ.get("TRACE"))
     await agent.run()
     
     